@@ -0,0 +1,739 @@
+#!/usr/bin/python3
+import melee
+import melee.archive
+import melee.latency
+import melee.recorder
+from melee.fakedolphin import ClosedLoopServer, FakeDolphin, ReplayServer, ScriptedPlayer, \
+    DASH_SPEED, FRAMETIME, encodefield, makedatagram, syntheticframe
+import argparse
+import asyncio
+import binascii
+import csv
+import fcntl
+import gc
+import os
+import socket
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+
+#This program measures how fast the various parts of libmelee run, without
+#   needing a copy of dolphin around. Run it before and after a change to see
+#   whether you've made things better or worse
+
+"""How many memory updates per second can GameState.update get through?"""
+def benchmark_decode(frames):
+    gamestate = melee.gamestate.GameState(FakeDolphin())
+    updates = [syntheticframe(i) for i in range(60)]
+    count = 0
+    start = time.perf_counter()
+    for i in range(frames):
+        for mem_update in updates[i % 60]:
+            gamestate.update(mem_update)
+        count += len(updates[i % 60])
+    elapsed = time.perf_counter() - start
+    print("decode: %d datagrams in %.3fs = %.0f datagrams/s (%.1fus per frame)" % \
+        (count, elapsed, count / elapsed, 1000000 * elapsed / frames))
+
+"""Made up memory updates for a frame of a one on one, where nobody's plugged
+    in to ports 3 and 4"""
+def oneononeframes():
+    unplugged = {field.address for field in melee.decoder.compilelocations().values() \
+        if field.name == "controller_status" and field.player in [3, 4]}
+    status = struct.pack('>I', melee.enums.ControllerStatus.CONTROLLER_UNPLUGGED.value)
+    return [[(address, status if address in unplugged else value) \
+        for address, value in syntheticframe(i)] for i in range(60)]
+
+"""How much does lazy decoding save, for a bot that only looks at a few fields?
+    Plays a one on one"""
+def benchmark_lazy(frames):
+    updates = oneononeframes()
+    for lazy in [False, True]:
+        gamestate = melee.gamestate.GameState(FakeDolphin(), lazy=lazy)
+        def run():
+            for i in range(frames):
+                for mem_update in updates[i % 60]:
+                    gamestate.update(mem_update)
+                # A typical bot reads position and action for both players
+                for player in [gamestate.ai_state, gamestate.opponent_state]:
+                    player.x, player.y, player.action, player.action_frame, player.percent
+        elapsed = besttime(run, 5, time.thread_time)
+        print("lazy=%s: %.1fus per frame" % (lazy, 1000000 * elapsed / frames))
+
+"""How much does publishing a snapshot at the end of each frame cost, in a one
+    on one? Steady mode fills in the same two snapshots turn about"""
+def benchmark_snapshot(frames):
+    updates = oneononeframes()
+    for snapshots, steady in [(False, False), (True, False), (True, True)]:
+        gamestate = melee.gamestate.GameState(FakeDolphin(), snapshots=snapshots, steady=steady)
+        def run():
+            for i in range(frames):
+                for mem_update in updates[i % 60]:
+                    gamestate.update(mem_update)
+        elapsed = besttime(run, 3)
+        print("snapshots=%s, steady=%s: %.1fus per frame" % (snapshots, steady, 1000000 * elapsed / frames))
+    #The differences are lost in the noise of decoding, so time making the
+    #   snapshots on their own too
+    gamestate = melee.gamestate.GameState(FakeDolphin(), snapshots=True)
+    for mem_update in updates[0]:
+        gamestate.update(mem_update)
+    previous = gamestate.snapshot
+    elapsed = besttime(lambda: [melee.gamestate.GameStateSnapshot(gamestate, previous) \
+        for i in range(frames)])
+    print("GameStateSnapshot: %.1fus each, with %d of %d players in use" % \
+        (1000000 * elapsed / frames, len(gamestate.activeplayers()), len(gamestate.player)))
+    elapsed = besttime(lambda: [previous.refill(gamestate) for i in range(frames)])
+    print("GameStateSnapshot.refill: %.1fus each" % (1000000 * elapsed / frames))
+    player = gamestate.ai_state
+    elapsed = besttime(lambda: [melee.gamestate.PlayerSnapshot(player) for i in range(frames)])
+    print("PlayerSnapshot: %.1fus each" % (1000000 * elapsed / frames))
+
+"""How much memory does each game take, and how fast are player attributes?"""
+def benchmark_memory(frames):
+    updates = [syntheticframe(i) for i in range(2)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    games = []
+    for i in range(10):
+        gamestate = melee.gamestate.GameState(FakeDolphin())
+        for frame in updates:
+            for mem_update in frame:
+                gamestate.update(mem_update)
+        games.append(gamestate)
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print("memory: %.1fKB per game" % (size / len(games) / 1024))
+    player = games[0].player[1]
+    def read():
+        for i in range(frames):
+            player.x; player.y; player.action; player.percent; player.facing
+    def write():
+        for i in range(frames):
+            player.x = 1.0; player.y = 1.0; player.percent = 1; player.facing = True
+    print("player attributes: %.1fns per read, %.1fns per write" % \
+        (1000000000 * besttime(read) / (5 * frames), 1000000000 * besttime(write) / (4 * frames)))
+
+#How much a frame is allowed to allocate in steady mode, once it's warmed up.
+#   Measured at 96 and 432 bytes, against 392 and 656 without steady mode
+#   Anything left over after the frame (in bytes, over the whole run)
+STEADY_GROWTH_BUDGET = 160
+#   The most that's allocated at once during a frame, in bytes
+STEADY_PEAK_BUDGET = 512
+
+"""How much does each frame allocate, between decoding and pressing buttons?
+    Fails if steady mode goes over its budget, or doesn't allocate less than
+    the default mode does"""
+def benchmark_alloc(frames):
+    frames = min(frames, 2000)
+    updates = []
+    for i in range(60):
+        # A couple of projectiles on screen
+        projectile = bytes(0x10) + struct.pack('>I', 0x36) + bytes(0x60 - 0x14)
+        updates.append([("00BDA4A4 8 2C 60", projectile)] * 2 + \
+            [update for update in syntheticframe(i) if update[0] != "00BDA4A4 8 2C 60"])
+    overbudget = False
+    #Dict of steady to (peak, growth)
+    results = dict()
+    for steady in [False, True]:
+        dolphin = FakeDolphin()
+        gamestate = melee.gamestate.GameState(dolphin, steady=steady)
+        controller = melee.controller.Controller(dolphin, 1, steady=steady)
+        controller.connect()
+        def frame(i):
+            for mem_update in updates[i % 60]:
+                gamestate.update(mem_update)
+            # Roughly what example.py does each frame
+            controller.tilt_analog(melee.enums.Button.BUTTON_MAIN, .5, 1)
+            controller.press_button(melee.enums.Button.BUTTON_A)
+            controller.release_button(melee.enums.Button.BUTTON_B)
+            controller.empty_input()
+            controller.flush()
+        # Warm up
+        for i in range(120):
+            frame(i)
+        collections = [0]
+        def countcollections(phase, info):
+            if phase == "start":
+                collections[0] += 1
+        gc.callbacks.append(countcollections)
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        peak = 0
+        for i in range(frames):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            frame(i)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+        growth = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+        gc.callbacks.remove(countcollections)
+        controller.disconnect()
+        print("alloc (steady=%s): %d bytes at most during a frame, %d bytes left over after %d frames, %d garbage collections" % \
+            (steady, peak, growth, frames, collections[0]))
+        results[steady] = (peak, growth)
+        if steady and (growth > STEADY_GROWTH_BUDGET or peak > STEADY_PEAK_BUDGET):
+            print("alloc: steady mode is over budget!")
+            overbudget = True
+    if results[True][0] >= results[False][0] or results[True][1] >= results[False][1]:
+        print("alloc: steady mode doesn't allocate any less than the default!")
+        overbudget = True
+    if overbudget:
+        sys.exit(1)
+
+"""How much does recording every memory update slow down decoding? The writer
+    thread's packing shares the CPU with decoding, so the time the decoding
+    thread itself spends is shown apart from the time it all takes"""
+def benchmark_record(frames):
+    datagrams = []
+    for i in range(60):
+        datagrams.append([makedatagram(address, value) \
+            for address, value in syntheticframe(i)])
+    for record in [False, True]:
+        dolphin = FakeDolphin()
+        recorder = None
+        if record:
+            recorder = melee.recorder.Recorder(dolphin.path + "/recording")
+        gamestate = melee.gamestate.GameState(dolphin, recorder=recorder)
+        def run():
+            for i in range(frames):
+                for data in datagrams[i % 60]:
+                    gamestate.updatedatagram(data)
+            if recorder is not None:
+                recorder.flush()
+        elapsed = besttime(run, 3)
+        cputime = besttime(run, 3, time.thread_time)
+        if recorder is not None:
+            recorder.close()
+        print("record=%s: %.1fus per frame, %.1fus of it on the decoding thread" % \
+            (record, 1000000 * elapsed / frames, 1000000 * cputime / frames))
+        if recorder is not None:
+            size = os.path.getsize(dolphin.path + "/recording")
+            print("    %.1f bytes per frame recorded" % (size / (6 * frames)))
+
+"""How much do block reads save, counting the parsing that dolphin's hex
+    encoding costs us? Blocks cut down on datagrams, but every field in them
+    still gets decoded one at a time, so decoding on its own barely changes.
+    The saving is in socket reads, so time it through a real socket as well"""
+def benchmark_blocks(frames):
+    for blockread in [False, True]:
+        gamestate = melee.gamestate.GameState(FakeDolphin(blockread=blockread))
+        datagrams = []
+        for i in range(60):
+            datagrams.append([makedatagram(address, value) \
+                for address, value in syntheticframe(i, blockread)])
+        def run():
+            for i in range(frames):
+                for data in datagrams[i % 60]:
+                    gamestate.updatedatagram(data)
+        elapsed = besttime(run, 3)
+        sender, receiver = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        received = 0
+        def runsocket():
+            nonlocal received
+            for i in range(frames):
+                for data in datagrams[i % 60]:
+                    sender.send(data)
+                start = time.perf_counter()
+                for data in datagrams[i % 60]:
+                    gamestate.updatedatagram(receiver.recv(9096))
+                received += time.perf_counter() - start
+        runsocket()
+        sender.close()
+        receiver.close()
+        print("blockread=%s: %d datagrams per frame, %.1fus per frame decoding, %.1fus with the socket reads" % \
+            (blockread, len(datagrams[0]), 1000000 * elapsed / frames, 1000000 * received / frames))
+"""How much is saved by only watching the fields a typical bot looks at?"""
+def benchmark_fields(frames):
+    for fields in [None, ["x", "y", "action", "action_frame", "percent", "stock", "facing"]]:
+        gamestate = melee.gamestate.GameState(FakeDolphin(fields=fields))
+        updates = [syntheticframe(i, fields=fields) for i in range(60)]
+        def run():
+            for i in range(frames):
+                for mem_update in updates[i % 60]:
+                    gamestate.update(mem_update)
+        elapsed = besttime(run, 3)
+        print("fields=%s: %d datagrams per frame, %.1fus per frame" % \
+            (fields, len(updates[0]), 1000000 * elapsed / frames))
+
+"""The way GameState.__next__ used to parse datagrams, for comparison"""
+def legacyparse(data):
+    data = data.decode('utf-8').splitlines()
+    return data[0], binascii.unhexlify(data[1].strip('\x00').zfill(8))
+
+"""Run the given function a few times, and return the fastest time it took
+    This machine is probably doing other things too, so the fastest run is the
+    one that is closest to the truth
+    clock = What to time it with. time.thread_time leaves out other threads"""
+def besttime(function, repeat=5, clock=time.perf_counter):
+    times = []
+    for i in range(repeat):
+        start = clock()
+        function()
+        times.append(clock() - start)
+    return min(times)
+
+"""The way FrameData.attackstate used to work, scanning through every frame of
+    the action on each call, for comparison"""
+def legacyattackstate(framedata, character, action, frame):
+    hitboxes = [action_frame for action_frame, data in framedata.framedata[character][action].items() \
+        if data and melee.framedata.hashitbox(data)]
+    if not hitboxes:
+        return melee.enums.AttackState.NOT_ATTACKING
+    if frame < min(hitboxes):
+        return melee.enums.AttackState.WINDUP
+    if frame > max(hitboxes):
+        return melee.enums.AttackState.COOLDOWN
+    return melee.enums.AttackState.ATTACKING
+
+"""How long does it take to load the frame data, with and without its compiled
+    cache, and then to ask it the usual questions about both players each frame?"""
+def benchmark_framedata(frames):
+    cachepaths = melee.framedata.CACHE_PATHS
+    directory = tempfile.mkdtemp()
+    melee.framedata.CACHE_PATHS = [os.path.join(directory, "framedata.cache")]
+    for name in ["no cache", "cold cache", "warm cache"]:
+        start = time.perf_counter()
+        framedata = melee.framedata.FrameData(cache=name != "no cache")
+        print("framedata (%s): %.0fms to load" % (name, 1000 * (time.perf_counter() - start)))
+    os.remove(melee.framedata.CACHE_PATHS[0])
+    os.rmdir(directory)
+    melee.framedata.CACHE_PATHS = cachepaths
+    #Players in whatever actions there's frame data for, in the middle of them
+    players = []
+    for character, actions in sorted(framedata.framedata.items(), key=lambda item: item[0].value):
+        for action, actionframes in sorted(actions.items(), key=lambda item: item[0].value):
+            players.append((character, action, (max(actionframes) + 1) // 2))
+    players = [players[i * 7 % len(players)] for i in range(2 * frames)]
+    def queries():
+        for character, action, frame in players:
+            framedata.attackstate(character, action, frame)
+            framedata.iasa(character, action)
+            framedata.hitboxcount(character, action)
+            framedata.lastframe(character, action)
+            framedata.isroll(character, action)
+            framedata.isgrab(character, action)
+            framedata.isbmove(character, action)
+            framedata.isshield(action)
+    def legacyqueries():
+        for character, action, frame in players:
+            legacyattackstate(framedata, character, action, frame)
+    elapsed = besttime(queries)
+    print("framedata: %.1fus per frame for 8 questions about 2 players" % (1000000 * elapsed / frames))
+    elapsed = besttime(legacyqueries)
+    print("framedata (legacy attackstate alone): %.1fus per frame for 2 players" % (1000000 * elapsed / frames))
+
+"""How fast can we turn raw datagrams into something we can decode?"""
+def benchmark_parse(frames):
+    gamestate = melee.gamestate.GameState(FakeDolphin())
+    datagrams = [address.encode() + b"\n" + binascii.hexlify(value).lstrip(b"0") + b"\x00" \
+        for address, value in syntheticframe(1)] * frames
+    def parseall(parse):
+        for data in datagrams:
+            parse(data)
+    def decodeall():
+        for data in datagrams:
+            gamestate.update(legacyparse(data))
+    def decodeallraw():
+        for data in datagrams:
+            gamestate.updatedatagram(data)
+
+    count = len(datagrams)
+    elapsed = besttime(lambda: parseall(legacyparse))
+    print("parse (legacy __next__): %.0f datagrams/s" % (count / elapsed))
+    elapsed = besttime(lambda: parseall(melee.decoder.parsedatagram))
+    print("parse (parsedatagram): %.0f datagrams/s" % (count / elapsed))
+    # Parsing and decoding together, the way GameState.step does it
+    elapsed = besttime(decodeall)
+    print("parse+decode (legacy __next__): %.0f datagrams/s" % (count / elapsed))
+    elapsed = besttime(decodeallraw)
+    print("parse+decode (updatedatagram): %.0f datagrams/s" % (count / elapsed))
+
+"""How many frames per second can GameState.step receive and decode?"""
+def benchmark_step(frames):
+    for drain in [False, True]:
+        dolphin = FakeDolphin()
+        gamestate = melee.gamestate.GameState(dolphin, drain=drain)
+        sender = ReplayServer(dolphin.get_memory_watcher_socket_path(),
+            frames=frames, speed=0)
+        sender.start()
+        start = time.perf_counter()
+        datagrams = 0
+        for i in range(frames):
+            gamestate.step()
+            datagrams += gamestate.datagrams
+        elapsed = time.perf_counter() - start
+        sender.join()
+        print("step (drain=%s): %d frames in %.3fs = %.0f frames/s (%.1f datagrams per frame)" % \
+            (drain, frames, elapsed, frames / elapsed, datagrams / frames))
+
+"""How many frames per second can GameState.step_async receive and decode?"""
+def benchmark_async(frames):
+    dolphin = FakeDolphin()
+    gamestate = melee.gamestate.GameState(dolphin)
+    sender = ReplayServer(dolphin.get_memory_watcher_socket_path(),
+        frames=frames, speed=0)
+    async def run():
+        datagrams = 0
+        for i in range(frames):
+            await gamestate.step_async()
+            datagrams += gamestate.datagrams
+        return datagrams
+    sender.start()
+    start = time.perf_counter()
+    datagrams = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    sender.join()
+    print("step_async: %d frames in %.3fs = %.0f frames/s (%.1f datagrams per frame)" % \
+        (frames, elapsed, frames / elapsed, datagrams / frames))
+
+"""What happens when the bot is a bit too slow to keep up? Without the
+    receiver thread, the sender gets held up (or the socket buffer fills up
+    with stale frames, if it's a big one)"""
+def benchmark_threaded(frames):
+    frames = min(frames, 2000)
+    for threaded in [False, True]:
+        dolphin = FakeDolphin()
+        gamestate = melee.gamestate.GameState(dolphin, threaded=threaded)
+        # Frames come in every 4ms
+        sender = ReplayServer(dolphin.get_memory_watcher_socket_path(),
+            speed=FRAMETIME / 0.004)
+        sender.start()
+        lag = []
+        skipped = 0
+        for i in range(frames):
+            gamestate.step()
+            lag.append(sender.sent.value - 1 - gamestate.frame)
+            skipped += gamestate.skippedframes
+            # The bot takes a little longer than a frame to think
+            time.sleep(0.006)
+        sender.stop()
+        gamestate.close()
+        print("threaded=%s: %d steps over %d frames sent, %d frames skipped, %.1f frames behind at worst" % \
+            (threaded, frames, sender.sent.value, skipped, max(lag)))
+        print("    %d frames dropped, %d duplicated, %d late" % \
+            (gamestate.droppedframes, gamestate.duplicateframes, gamestate.lateframes))
+
+"""Play frames at GameState.step from a stand-in for dolphin: as fast as it
+    can take them, then at real time to see how long each frame takes to get
+    through, and then with a bot that's too slow, to see what gets dropped"""
+def benchmark_replay(frames):
+    dolphin = FakeDolphin()
+    gamestate = melee.gamestate.GameState(dolphin)
+    sender = ReplayServer(dolphin.get_memory_watcher_socket_path(), frames=frames, speed=0)
+    sender.start()
+    start = time.perf_counter()
+    for i in range(frames):
+        gamestate.step()
+    elapsed = time.perf_counter() - start
+    sender.join()
+    print("replay (unthrottled): %d frames in %.3fs = %.0f frames/s" % (frames, elapsed, frames / elapsed))
+
+    # Real time is slow going, so don't do too much of it
+    realtime = min(frames, 600)
+    dolphin = FakeDolphin()
+    gamestate = melee.gamestate.GameState(dolphin)
+    sender = ReplayServer(dolphin.get_memory_watcher_socket_path(), frames=realtime)
+    sender.start()
+    latency = []
+    for i in range(realtime):
+        gamestate.step()
+        latency.append(time.monotonic() - sender.due(gamestate.frame))
+    sender.join()
+    latency.sort()
+    print("replay (real time): latency p50 %.0fus, p99 %.0fus, max %.0fus" % \
+        tuple(1000000 * latency[int(p * (len(latency) - 1))] for p in [0.5, 0.99, 1]))
+
+    dolphin = FakeDolphin()
+    gamestate = melee.gamestate.GameState(dolphin)
+    sender = ReplayServer(dolphin.get_memory_watcher_socket_path(), speed=1, block=False)
+    sender.start()
+    for i in range(realtime // 2):
+        gamestate.step()
+        # The bot takes two frames to think
+        time.sleep(2 * FRAMETIME)
+    sender.stop()
+    print("replay (slow bot): %d frames sent, %d datagrams dropped, %d frames dropped" % \
+        (sender.sent.value, sender.dropped.value, gamestate.droppedframes))
+
+"""How long does it take for a bot's input to show up in the game state? Plays
+    against a fake game that reacts to the controller pipe straight away, so
+    that this is all libmelee: Controller.flush, the pipe, the memory updates
+    coming back, and GameState.step. With and without the bot being busy"""
+def benchmark_loop(frames):
+    roundtrips = min(frames, 1000)
+    for busy in [0, 0.005]:
+        dolphin = FakeDolphin(pipes=True)
+        gamestate = melee.gamestate.GameState(dolphin)
+        server = ClosedLoopServer(dolphin, react=True)
+        server.start()
+        controller = melee.controller.Controller(dolphin, dolphin.ai_port)
+        controller.connect()
+        latency = []
+        steps = 0
+        sent = None
+        expected = None
+        while len(latency) < roundtrips:
+            gamestate.step()
+            steps += 1
+            if expected is not None and gamestate.player[2].speed_ground_x_self != expected:
+                continue
+            if sent is not None:
+                latency.append(time.perf_counter() - sent)
+            # Think about it for a bit, then run the other way
+            thinking = time.perf_counter() + busy
+            while time.perf_counter() < thinking:
+                pass
+            stick = 1 if expected != DASH_SPEED else 0
+            expected = (stick - .5) * 2 * DASH_SPEED
+            controller.tilt_analog(melee.enums.Button.BUTTON_MAIN, stick, .5)
+            sent = time.perf_counter()
+            controller.flush()
+        server.stop()
+        controller.disconnect()
+        latency.sort()
+        print("loop (bot busy for %.0fms): input to state p50 %.0fus, p99 %.0fus, max %.0fus (%.2f steps each)" % \
+            ((busy * 1000,) + tuple(1000000 * latency[int(p * (len(latency) - 1))] \
+            for p in [0.5, 0.99, 1]) + (steps / roundtrips,)))
+
+"""How much does the controller send to dolphin each frame? The bot here
+    holds the same input for a few frames at a time, like most bots do"""
+def benchmark_flush(frames):
+    dolphin = FakeDolphin()
+    controller = melee.controller.Controller(dolphin, dolphin.ai_port)
+    controller.pipe_path = tempfile.mktemp()
+    controller.connect()
+    buttons = [melee.enums.Button.BUTTON_A, None, melee.enums.Button.BUTTON_X, None]
+    start = time.perf_counter()
+    for i in range(frames):
+        controller.empty_input()
+        controller.simple_press(i // 5 % 3 / 2, .5, buttons[i // 8 % 4])
+        controller.flush()
+    elapsed = time.perf_counter() - start
+    controller.disconnect()
+    written = os.path.getsize(controller.pipe_path)
+    os.remove(controller.pipe_path)
+    print("flush: %.1f bytes per frame, %.1fus per frame" % (written / frames, 1000000 * elapsed / frames))
+
+"""How much does it cost to run a techskill sequence each frame? Both as a bot
+    function that presses buttons by hand, and as a Macro that the controller
+    plays by itself. They should send dolphin the exact same thing"""
+def benchmark_macro(frames):
+    Action = melee.enums.Action
+    #Fox's actions through one multishine, over and over
+    cycle = [(Action.STANDING, 1)] + [(Action.KNEE_BEND, f) for f in range(1, 4)] + \
+        [(Action.DOWN_B_GROUND_START, f) for f in range(1, 6)] + [(Action.DOWN_B_GROUND, 1)]
+    player = melee.gamestate.PlayerState()
+    player.on_ground = True
+    dolphin = FakeDolphin()
+    results = []
+    for name in ["function", "macro"]:
+        controller = melee.controller.Controller(dolphin, dolphin.ai_port)
+        controller.pipe_path = tempfile.mktemp()
+        controller.connect()
+        if name == "macro":
+            controller.play(melee.techskill.MULTISHINE, player)
+        start = time.perf_counter()
+        for i in range(frames):
+            player.action, player.action_frame = cycle[i % len(cycle)]
+            if name == "function":
+                controller.empty_input()
+                melee.techskill.multishine(player, controller)
+            controller.flush()
+        elapsed = time.perf_counter() - start
+        controller.disconnect()
+        with open(controller.pipe_path) as pipe:
+            results.append(pipe.read())
+        os.remove(controller.pipe_path)
+        print("macro (%s): %.1fus per frame" % (name, 1000000 * elapsed / frames))
+    print("macro: inputs sent %s" % ("match" if results[0] == results[1] else "DIFFER"))
+
+"""What happens to the bot when dolphin hangs? First with dolphin not there to
+    connect to at all, then with it not reading its controller pipe for a while.
+    Neither should hold the bot up for longer than its timeouts"""
+def benchmark_stall(frames):
+    directory = tempfile.mkdtemp()
+    dolphin = FakeDolphin()
+    controller = melee.controller.Controller(dolphin, dolphin.ai_port, write_timeout=0.002)
+    controller.pipe_path = os.path.join(directory, "pipe")
+    os.mkfifo(controller.pipe_path)
+    start = time.perf_counter()
+    connected = controller.connect(timeout=0.1)
+    print("stall: connect with nobody there gave %s after %.0fms" % \
+        (connected, 1000 * (time.perf_counter() - start)))
+    reader = os.open(controller.pipe_path, os.O_RDONLY | os.O_NONBLOCK)
+    #Shrink the pipe where we can, so that it fills up sooner
+    if hasattr(fcntl, "F_SETPIPE_SZ"):
+        fcntl.fcntl(reader, fcntl.F_SETPIPE_SZ, 4096)
+    controller.connect(timeout=1)
+    #The "emulator" stops reading for the middle half of the frames
+    hung = range(frames // 4, 3 * frames // 4)
+    worst = 0
+    for i in range(frames):
+        controller.tilt_analog(melee.enums.Button.BUTTON_MAIN, i % 3 / 2, (i // 3) % 3 / 2)
+        start = time.perf_counter()
+        controller.flush()
+        worst = max(worst, time.perf_counter() - start)
+        if i not in hung:
+            try:
+                while os.read(reader, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+    controller.disconnect()
+    os.close(reader)
+    os.remove(controller.pipe_path)
+    os.rmdir(directory)
+    print("stall: %d of %d flushes stalled, %d timed out, %.1fms waiting in all, longest flush %.1fms" % \
+        (controller.writestalls, frames, controller.writetimeouts, 1000 * controller.stalltime, 1000 * worst))
+
+"""How many frames does it take for each kind of input to show up as an action
+    change, in real time and in lockstep? The fake game acts on inputs the very
+    next frame, so anything more is down to the pipe or the bot. Threaded mode
+    runs the game flat out, so that the bot's flushes and the receiver thread's
+    frames hit the tracker at the same time"""
+def benchmark_latency(frames):
+    frames = min(frames, 1200)
+    Button = melee.enums.Button
+    #What the bot does on each third of a second, over and over
+    script = [(Button.BUTTON_A, .5), (None, .5), (None, 0), (None, .5), (Button.BUTTON_X, .5),
+        (None, .5), (None, .5), (None, 1), (None, .5)]
+    for mode in ["real time", "lockstep", "threaded"]:
+        tracker = melee.latency.LatencyTracker(melee.latency.TECHSKILL_ACTIONS)
+        dolphin = FakeDolphin(pipes=True, lockstep=mode == "lockstep")
+        gamestate = melee.gamestate.GameState(dolphin, latency=tracker, threaded=mode == "threaded")
+        server = ClosedLoopServer(dolphin, speed=0 if mode == "lockstep" else 1)
+        server.start()
+        controller = melee.controller.Controller(dolphin, dolphin.ai_port, latency=tracker)
+        controller.connect()
+        for i in range(frames):
+            gamestate.step()
+            button, x = script[gamestate.frame // 20 % len(script)]
+            controller.simple_press(x, .5, button)
+            controller.flush()
+        server.stop()
+        controller.disconnect()
+        for line in tracker.report().split("\n"):
+            print("latency (%s): %s" % (mode, line))
+        if mode == "threaded":
+            print("latency (threaded): receiver thread %s" % \
+                ("still running" if gamestate.receiver.is_alive() else "DIED"))
+        gamestate.close()
+
+"""How many frames per second does a game reach in lockstep mode, where it
+    waits for the bot's inputs every frame? Both with a bot that keeps up
+    easily, and one that's too slow for real time"""
+def benchmark_lockstep(frames):
+    for thinking in [0, 0.025]:
+        count = frames if not thinking else min(frames, 120)
+        dolphin = FakeDolphin(pipes=True, lockstep=True)
+        gamestate = melee.gamestate.GameState(dolphin)
+        server = ClosedLoopServer(dolphin, speed=0)
+        server.start()
+        controller = melee.controller.Controller(dolphin, dolphin.ai_port)
+        controller.connect()
+        start = time.perf_counter()
+        for i in range(count):
+            gamestate.step()
+            time.sleep(thinking)
+            controller.tilt_analog(melee.enums.Button.BUTTON_MAIN, i % 2, .5)
+            controller.flush()
+        elapsed = time.perf_counter() - start
+        server.stop()
+        controller.disconnect()
+        print("lockstep (bot thinks for %.0fms): %d frames at %.0f frames/s, %d acked, %d dropped, %d late" % \
+            (thinking * 1000, count, count / elapsed, gamestate.ackedframes, gamestate.droppedframes,
+            gamestate.lateframes))
+
+"""How fast does a lockstep game go with several bots played from one process,
+    all reading the one GameState? Each port dashes back and forth on its own
+    schedule, so the game only matches up if every port's inputs land"""
+def benchmark_multi(frames):
+    frames = min(frames, 1200)
+    for ports in [[2], [2, 1], [2, 1, 3, 4]]:
+        dolphin = FakeDolphin(ai_port=ports[0], opponent_port=1, pipes=True, lockstep=True,
+            ai_ports=ports)
+        gamestate = melee.gamestate.GameState(dolphin)
+        server = ClosedLoopServer(dolphin, speed=0)
+        server.start()
+        controllers = melee.controller.ControllerGroup(dolphin)
+        controllers.connect()
+        moved = 0
+        start = time.perf_counter()
+        for i in range(frames):
+            gamestate.step()
+            for port, player in gamestate.ai_states.items():
+                #Inputs from the frame before show up as speed this frame
+                if i > 1 and player.speed_ground_x_self == DASH_SPEED * (1 if (i - 1) // (port * 5) % 2 else -1):
+                    moved += 1
+                controllers[port].tilt_analog(melee.enums.Button.BUTTON_MAIN, i // (port * 5) % 2, .5)
+            controllers.flush()
+        elapsed = time.perf_counter() - start
+        server.stop()
+        controllers.disconnect()
+        print("multi (%d bots): %.0f frames/s, %d acked, inputs took effect %.1f%% of the time" % \
+            (len(ports), frames / elapsed, gamestate.ackedframes, 100 * moved / (len(ports) * (frames - 2))))
+
+"""How small do archives of a game come out, and how fast are they to write
+    and read back? Uses a game played with the fake dolphin's scripted
+    players, where most things stay put from one frame to the next"""
+def benchmark_archive(frames):
+    frames = min(frames, 3600)
+    gamestate = melee.gamestate.GameState(FakeDolphin())
+    fields = melee.decoder.compilelocations()
+    players = {2: ScriptedPlayer(-20), 1: ScriptedPlayer(20)}
+    controller = melee.controller.ControllerState()
+    idle = melee.controller.ControllerState()
+    snapshots = []
+    for i in range(frames):
+        # Change up what the bot's doing every third of a second
+        if i % 20 == 0:
+            controller.main_stick = ((i * 7) % 11 / 10, .5)
+            controller.button[melee.enums.Button.BUTTON_X] = i % 60 == 0
+            controller.button[melee.enums.Button.BUTTON_A] = i % 100 == 0
+        for port, player in players.items():
+            player.step(controller if port == 2 else idle)
+        values = {port: player.values() for port, player in players.items()}
+        values[0] = {"frame": i, "menu_state": melee.enums.Menu.IN_GAME.value,
+            "stage": melee.enums.Stage.BATTLEFIELD.value}
+        for port in range(1, 9):
+            values.setdefault(port, {})
+        for address, field in fields.items():
+            gamestate.update((address, encodefield(field, values)))
+        snapshots.append(melee.gamestate.GameStateSnapshot(gamestate))
+    csvfile = tempfile.TemporaryFile("w+")
+    writer = csv.writer(csvfile)
+    for snapshot in snapshots:
+        writer.writerow(melee.archive.framevalues(snapshot, sorted(snapshot.player)))
+    print("archive (csv): %.0f bytes per frame" % (csvfile.tell() / frames))
+    for compression in [None, "zlib", "lzma"]:
+        path = tempfile.mktemp()
+        start = time.perf_counter()
+        archive = melee.archive.ArchiveWriter(path, compression)
+        for snapshot in snapshots:
+            archive.write(snapshot)
+        archive.close()
+        written = time.perf_counter() - start
+        start = time.perf_counter()
+        count = sum(1 for frame in melee.archive.Archive(path))
+        read = time.perf_counter() - start
+        print("archive (%s): %.1f bytes per frame, %.0fus per frame to write, %.0f frames/s to read" % \
+            (compression, os.path.getsize(path) / frames, 1000000 * written / frames, count / read))
+        os.remove(path)
+
+benchmarks = {"alloc": benchmark_alloc, "archive": benchmark_archive, "async": benchmark_async, "blocks": benchmark_blocks, "decode": benchmark_decode, "fields": benchmark_fields, "flush": benchmark_flush, "framedata": benchmark_framedata, "latency": benchmark_latency, "lazy": benchmark_lazy, "lockstep": benchmark_lockstep, "loop": benchmark_loop, "macro": benchmark_macro, "memory": benchmark_memory, "multi": benchmark_multi, "parse": benchmark_parse, "record": benchmark_record, "replay": benchmark_replay, "snapshot": benchmark_snapshot, "stall": benchmark_stall, "step": benchmark_step, "threaded": benchmark_threaded}
+
+parser = argparse.ArgumentParser(description='Benchmarks for libmelee')
+parser.add_argument('benchmark', nargs='*',
+                    help='Which benchmarks to run, out of: ' + ', '.join(sorted(benchmarks)) + \
+                    '. Runs all of them by default')
+parser.add_argument('--frames', '-f', type=int, default=6000,
+                    help='How many frames to run each benchmark for')
+args = parser.parse_args()
+for name in args.benchmark:
+    if name not in benchmarks:
+        parser.error("Unknown benchmark: " + name)
+
+for name in args.benchmark or sorted(benchmarks):
+    benchmarks[name](args.frames)
@@ -78,7 +78,10 @@ dolphin.run(render=True)
 #   Due to how named pipes work, this has to come AFTER running dolphin
 #   NOTE: If you're loading a movie file, don't connect the controller,
 #   dolphin will hang waiting for input and never receive it
-controller.connect()
+if not controller.connect():
+    print("ERROR: Dolphin never opened its controller pipe")
+    dolphin.terminate()
+    sys.exit(-1)
 
 #Main loop
 while True:
@@ -6,6 +6,7 @@ from melee.dolphin import Dolphin
 from melee.logger import Logger
 from melee.gamestate import GameState
 from melee.enums import Stage, Menu, Character, Button, Action, ProjectileSubtype
-from melee.controller import Controller, ControllerState
-from melee import menuhelper, techskill, framedata, stages, dtmreader
+from melee.controller import Controller, ControllerGroup, ControllerState
+from melee.macro import Macro
+from melee import menuhelper, techskill, macro, framedata, stages, dtmreader
 import melee.version
@@ -0,0 +1,465 @@
+"""Compact archives of decoded GameState frames, for keeping long sessions around
+Most of the game doesn't change from one frame to the next, so each frame only
+stores the values that did. Frames are grouped into blocks, each of which
+starts with a keyframe holding everything, and gets compressed on its own.
+That way a reader can jump straight to the block a frame is in, rather than
+replaying the whole session up to it.
+
+The file is laid out like so. All little endian:
+    header: MAGIC, version (uint32), compression (uint8), ai port (uint8),
+        opponent port (uint8), then the column names (see below)
+    blocks: first frame counter (uint32), frame count (uint32), raw length
+        (uint32), stored length (uint32), then the (maybe compressed) frames
+    index: first frame counter (uint32), first record number (uint64) and
+        file offset (uint64) per block, then the offset of the index (uint64)
+        and INDEX_MAGIC
+The index only gets written when the archive is closed. Without it, the
+block headers can still be walked through to find everything.
+
+Records are numbered from 0 in the order they were written. Unlike the frame
+counter, which starts over with every game, that number only ever goes up, so
+it's what seek() goes by. A block never spans two games: whenever the frame
+counter goes backwards, a new block starts.
+
+Each frame in a block is a varint count of changed columns, and then for each
+change, a varint of how many columns along it is from the last one, followed
+by the value. A value is a type tag byte then its payload. Integers store the
+difference from the column's old value where they can. Last of all comes the
+projectiles: a 0 if they didn't change, otherwise 1 + how many there are and
+then each projectile.
+
+Columns are the FRAMEATTRIBUTES of the GameState, then every PlayerState
+attribute for each player, named like "2.x" """
+from melee import enums
+from melee.gamestate import FRAMEATTRIBUTES, PlayerState, Projectile, getplayerstate
+import bisect
+import enum
+import lzma
+import queue
+import struct
+import threading
+import zlib
+
+MAGIC = b"MELEEARC"
+INDEX_MAGIC = b"MELEEIDX"
+VERSION = 2
+HEADER = struct.Struct("<8sIBBB")
+BLOCK = struct.Struct("<IIII")
+INDEX = struct.Struct("<IQQ")
+INDEX_FOOTER = struct.Struct("<Q8s")
+FLOAT32 = struct.Struct("<f")
+FLOAT64 = struct.Struct("<d")
+PROJECTILE = struct.Struct("<ffffBI")
+
+#How a block's frames are compressed
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_LZMA = 2
+COMPRESSIONS = {None: COMPRESSION_NONE, "zlib": COMPRESSION_ZLIB, "lzma": COMPRESSION_LZMA}
+
+#Type tags for values
+TAG_NONE = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+#A whole integer, zigzag varint
+TAG_INT = 3
+#The difference from the column's old integer value, zigzag varint
+TAG_DELTA = 4
+TAG_FLOAT32 = 5
+TAG_FLOAT64 = 6
+#Index into ENUMS (varint), then the enum's value (zigzag varint)
+TAG_ENUM = 7
+
+#The enums that a GameState holds. Only ever add to the end of this
+ENUMS = [enums.Stage, enums.Menu, enums.Character, enums.Action,
+    enums.ControllerStatus, enums.ProjectileSubtype]
+ENUM_INDEX = {enumtype: i for i, enumtype in enumerate(ENUMS)}
+
+"""Append an unsigned varint to a bytearray"""
+def writevarint(data, value):
+    while value > 0x7f:
+        data.append((value & 0x7f) | 0x80)
+        value >>= 7
+    data.append(value)
+
+"""Read an unsigned varint from data at offset. Returns (value, new offset)"""
+def readvarint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+"""Map signed integers onto unsigned ones, so small negatives stay small"""
+def zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+"""Append one value to a bytearray, given the column's old value"""
+def writevalue(data, value, old):
+    if value is None:
+        data.append(TAG_NONE)
+    elif value is True:
+        data.append(TAG_TRUE)
+    elif value is False:
+        data.append(TAG_FALSE)
+    elif isinstance(value, enum.Enum):
+        data.append(TAG_ENUM)
+        writevarint(data, ENUM_INDEX[type(value)])
+        writevarint(data, zigzag(value.value))
+    elif isinstance(value, int):
+        if type(old) is int:
+            data.append(TAG_DELTA)
+            writevarint(data, zigzag(value - old))
+        else:
+            data.append(TAG_INT)
+            writevarint(data, zigzag(value))
+    elif isinstance(value, float):
+        #Most floats come out of Melee's memory as singles, so try that first
+        packed = FLOAT32.pack(value)
+        if FLOAT32.unpack(packed)[0] == value:
+            data.append(TAG_FLOAT32)
+            data += packed
+        else:
+            data.append(TAG_FLOAT64)
+            data += FLOAT64.pack(value)
+    else:
+        raise ValueError("Can't archive a " + type(value).__name__)
+
+"""Read one value from data at offset, given the column's old value
+    Returns (value, new offset)"""
+def readvalue(data, offset, old):
+    tag = data[offset]
+    offset += 1
+    if tag == TAG_NONE:
+        return None, offset
+    if tag == TAG_TRUE:
+        return True, offset
+    if tag == TAG_FALSE:
+        return False, offset
+    if tag == TAG_DELTA:
+        value, offset = readvarint(data, offset)
+        return old + unzigzag(value), offset
+    if tag == TAG_INT:
+        value, offset = readvarint(data, offset)
+        return unzigzag(value), offset
+    if tag == TAG_FLOAT32:
+        return FLOAT32.unpack_from(data, offset)[0], offset + 4
+    if tag == TAG_FLOAT64:
+        return FLOAT64.unpack_from(data, offset)[0], offset + 8
+    if tag == TAG_ENUM:
+        enumtype, offset = readvarint(data, offset)
+        value, offset = readvarint(data, offset)
+        value = unzigzag(value)
+        try:
+            return ENUMS[enumtype](value), offset
+        except ValueError:
+            return value, offset
+    raise ValueError("Bad value tag in archive: " + str(tag))
+
+"""The values for every column of a frame, as a list"""
+def framevalues(gamestate, ports):
+    values = [getattr(gamestate, name) for name in FRAMEATTRIBUTES]
+    for port in ports:
+        values.extend(getplayerstate(gamestate.player[port]))
+    return values
+
+"""Writes GameState frames out to an archive as they come in
+    Finished blocks are compressed and written out on a background thread, so
+    that an lzma block doesn't hold up the bot
+    path = Where to write the archive
+    compression = "zlib", "lzma" or None
+    keyframeinterval = How many frames go in each block. Seeking has to read
+        through at most this many frames to get to the one it wants"""
+class ArchiveWriter:
+    def __init__(self, path, compression="zlib", keyframeinterval=600):
+        if compression not in COMPRESSIONS:
+            raise ValueError("Unknown compression: " + str(compression))
+        self.path = path
+        self.compression = COMPRESSIONS[compression]
+        self.keyframeinterval = keyframeinterval
+        self.file = open(path, "wb")
+        #Player ports, in column order. Filled in by the first frame
+        self.ports = None
+        #The values of every column as of the last frame, or None at the
+        #   start of a block
+        self.previous = None
+        self.previousprojectiles = None
+        #The current block
+        self.data = bytearray()
+        self.firstframe = 0
+        self.frames = 0
+        #How many frames have been written in all, and the record number of
+        #   the first one in the current block
+        self.records = 0
+        self.firstrecord = 0
+        #The frame counter of the last frame written
+        self.lastframe = None
+        #List of (first frame counter, first record number, file offset) for each block
+        self.index = []
+        self.offset = 0
+        self.pending = queue.Queue()
+        self.writer = threading.Thread(target=self.writeblocks, daemon=True)
+        self.writer.start()
+
+    """Write out the header, now that we know which players there are"""
+    def writeheader(self, gamestate):
+        self.ports = sorted(gamestate.player)
+        aiport = opponentport = 0
+        for port, player in gamestate.player.items():
+            if player is gamestate.ai_state:
+                aiport = port
+            if player is gamestate.opponent_state:
+                opponentport = port
+        header = bytearray(HEADER.pack(MAGIC, VERSION, self.compression, aiport, opponentport))
+        columns = list(FRAMEATTRIBUTES)
+        for port in self.ports:
+            columns.extend(str(port) + "." + name for name in PlayerState.__slots__)
+        writevarint(header, len(columns))
+        for column in columns:
+            name = column.encode()
+            writevarint(header, len(name))
+            header += name
+        self.file.write(header)
+        self.offset = len(header)
+
+    """Add a frame to the archive. Works with a GameState or a snapshot of one"""
+    def write(self, gamestate):
+        if self.ports is None:
+            self.writeheader(gamestate)
+        if self.lastframe is not None and gamestate.frame < self.lastframe:
+            #A new game, so start a new block for it
+            self.endblock()
+        self.lastframe = gamestate.frame
+        values = framevalues(gamestate, self.ports)
+        previous = self.previous
+        data = self.data
+        if previous is None:
+            #Keyframe, so everything goes in
+            self.firstframe = gamestate.frame
+            self.firstrecord = self.records
+            changed = range(len(values))
+            previous = [None] * len(values)
+        else:
+            changed = [i for i, value in enumerate(values) if value != previous[i] \
+                or type(value) is not type(previous[i])]
+        writevarint(data, len(changed))
+        last = 0
+        for i in changed:
+            writevarint(data, i - last)
+            last = i
+            writevalue(data, values[i], previous[i])
+        projectiles = [projectile.tolist() for projectile in gamestate.projectiles]
+        if projectiles == self.previousprojectiles:
+            data.append(0)
+        else:
+            writevarint(data, len(projectiles) + 1)
+            for x, y, x_speed, y_speed, owned, subtype in projectiles:
+                data += PROJECTILE.pack(x, y, x_speed, y_speed, owned, subtype)
+        self.previous = values
+        self.previousprojectiles = projectiles
+        self.frames += 1
+        self.records += 1
+        if self.frames >= self.keyframeinterval:
+            self.endblock()
+
+    """Hand the current block off to be written out, and start a new one"""
+    def endblock(self):
+        if not self.frames:
+            return
+        self.pending.put((self.firstframe, self.firstrecord, self.frames, self.data))
+        self.data = bytearray()
+        self.frames = 0
+        self.previous = None
+        self.previousprojectiles = None
+
+    """Compress and write out blocks as they come in. Runs on the writer thread"""
+    def writeblocks(self):
+        while True:
+            block = self.pending.get()
+            if block is None:
+                return
+            firstframe, firstrecord, frames, data = block
+            if self.compression == COMPRESSION_ZLIB:
+                stored = zlib.compress(data)
+            elif self.compression == COMPRESSION_LZMA:
+                stored = lzma.compress(data)
+            else:
+                stored = data
+            self.index.append((firstframe, firstrecord, self.offset))
+            self.file.write(BLOCK.pack(firstframe, frames, len(data), len(stored)))
+            self.file.write(stored)
+            self.offset += BLOCK.size + len(stored)
+
+    """Finish up the archive, with its index. Nothing more can be written after this"""
+    def close(self):
+        if self.file.closed:
+            return
+        self.endblock()
+        self.pending.put(None)
+        self.writer.join()
+        if self.ports is not None:
+            indexoffset = self.offset
+            for entry in self.index:
+                self.file.write(INDEX.pack(*entry))
+            self.file.write(INDEX_FOOTER.pack(indexoffset, INDEX_MAGIC))
+        self.file.close()
+
+"""One frame read back out of an archive. Has the same attributes as a
+    GameState snapshot: the FRAMEATTRIBUTES, player, ai_state, opponent_state
+    and projectiles"""
+class ArchivedFrame:
+    def __init__(self, values, ports, aiport, opponentport, projectiles):
+        for name, value in zip(FRAMEATTRIBUTES, values):
+            setattr(self, name, value)
+        self.player = dict()
+        offset = len(FRAMEATTRIBUTES)
+        for port in ports:
+            player = PlayerState()
+            for name, value in zip(PlayerState.__slots__, values[offset:]):
+                setattr(player, name, value)
+            offset += len(PlayerState.__slots__)
+            self.player[port] = player
+        self.ai_state = self.player.get(aiport)
+        self.opponent_state = self.player.get(opponentport)
+        self.projectiles = []
+        for x, y, x_speed, y_speed, owned, subtype in projectiles:
+            projectile = Projectile()
+            projectile.x = x
+            projectile.y = y
+            projectile.x_speed = x_speed
+            projectile.y_speed = y_speed
+            projectile.opponent_owned = bool(owned)
+            try:
+                projectile.subtype = enums.ProjectileSubtype(subtype)
+            except ValueError:
+                projectile.subtype = enums.ProjectileSubtype.UNKNOWN_PROJECTILE
+            self.projectiles.append(projectile)
+
+"""Reads an archive written by ArchiveWriter
+    Iterate over it for every frame, or use seek() to start from a given record"""
+class Archive:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        magic, version, self.compression, self.aiport, self.opponentport = \
+            HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(path + " isn't an archive")
+        if version != VERSION:
+            raise ValueError("Unsupported archive version: " + str(version))
+        #The column names are short, so this is plenty to read them from
+        data = self.file.read(1 << 16)
+        count, offset = readvarint(data, 0)
+        self.columns = []
+        for i in range(count):
+            length, offset = readvarint(data, offset)
+            self.columns.append(data[offset:offset + length].decode())
+            offset += length
+        self.start = HEADER.size + offset
+        self.ports = sorted({int(column.split(".")[0]) for column in self.columns if "." in column})
+        #List of (first frame counter, first record number, file offset) for each block
+        self.index = self.readindex()
+        self.firstrecords = [firstrecord for firstframe, firstrecord, offset in self.index]
+
+    """Read the index from the end of the file, or walk through the block
+        headers to build it if the archive never got closed"""
+    def readindex(self):
+        self.file.seek(0, 2)
+        end = self.file.tell()
+        if end >= self.start + INDEX_FOOTER.size:
+            self.file.seek(end - INDEX_FOOTER.size)
+            indexoffset, magic = INDEX_FOOTER.unpack(self.file.read(INDEX_FOOTER.size))
+            if magic == INDEX_MAGIC:
+                self.file.seek(indexoffset)
+                data = self.file.read(end - INDEX_FOOTER.size - indexoffset)
+                return list(INDEX.iter_unpack(data))
+        index = []
+        offset = self.start
+        records = 0
+        while offset + BLOCK.size <= end:
+            self.file.seek(offset)
+            firstframe, frames, rawlength, storedlength = BLOCK.unpack(self.file.read(BLOCK.size))
+            if offset + BLOCK.size + storedlength > end:
+                #Cut off partway through
+                break
+            index.append((firstframe, records, offset))
+            records += frames
+            offset += BLOCK.size + storedlength
+        return index
+
+    """Read in and decompress the block at the given offset
+        Returns (frame count, raw frame data)"""
+    def readblock(self, offset):
+        self.file.seek(offset)
+        firstframe, frames, rawlength, storedlength = BLOCK.unpack(self.file.read(BLOCK.size))
+        data = self.file.read(storedlength)
+        if self.compression == COMPRESSION_ZLIB:
+            data = zlib.decompress(data)
+        elif self.compression == COMPRESSION_LZMA:
+            data = lzma.decompress(data)
+        return frames, data
+
+    """Iterate over the frames in the block at the given offset"""
+    def blockframes(self, offset):
+        frames, data = self.readblock(offset)
+        values = [None] * len(self.columns)
+        projectiles = []
+        position = 0
+        for i in range(frames):
+            changes, position = readvarint(data, position)
+            column = 0
+            for j in range(changes):
+                step, position = readvarint(data, position)
+                column += step
+                values[column], position = readvalue(data, position, values[column])
+            count, position = readvarint(data, position)
+            if count:
+                projectiles = list(PROJECTILE.iter_unpack(
+                    data[position:position + (count - 1) * PROJECTILE.size]))
+                position += (count - 1) * PROJECTILE.size
+            yield ArchivedFrame(values, self.ports, self.aiport, self.opponentport, projectiles)
+
+    """Iterate over every frame in the archive"""
+    def __iter__(self):
+        for firstframe, firstrecord, offset in self.index:
+            yield from self.blockframes(offset)
+
+    """Iterate over the frames from the given record number on"""
+    def seek(self, record):
+        #The last block that starts at or before the record
+        start = max(0, bisect.bisect_right(self.firstrecords, record) - 1)
+        for firstframe, firstrecord, offset in self.index[start:]:
+            for archived in self.blockframes(offset):
+                if firstrecord >= record:
+                    yield archived
+                firstrecord += 1
+
+    """Read back a single frame, by its frame counter. None if it's not there
+        If the archive has more than one game in it, this is the first game's
+        frame with that counter"""
+    def frame(self, frame):
+        for i, (firstframe, firstrecord, offset) in enumerate(self.index):
+            if firstframe > frame:
+                continue
+            #Blocks within a game start at ever higher frame counters, so a
+            #   later block in the same game that starts at or before the
+            #   frame means it isn't in this one
+            if i + 1 < len(self.index):
+                nextframe = self.index[i + 1][0]
+                if firstframe < nextframe <= frame:
+                    continue
+            for archived in self.blockframes(offset):
+                if archived.frame == frame:
+                    return archived
+                if archived.frame > frame:
+                    break
+        return None
+
+    def close(self):
+        self.file.close()
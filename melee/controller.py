@@ -1,29 +1,142 @@
 from melee import enums, logger
+import asyncio
 import copy
+import errno
+import functools
+import os
+import select
+import time
+from collections.abc import MutableMapping
 
-"""A snapshot of the state of a virtual controller"""
+#Which bit each digital button is in, in a packed controller state. This is
+#   the same layout that dolphin uses for each frame of input in a DTM file
+BUTTON_BITS = {enums.Button.BUTTON_A: 1, enums.Button.BUTTON_B: 2, enums.Button.BUTTON_X: 3,
+    enums.Button.BUTTON_Y: 4, enums.Button.BUTTON_Z: 5, enums.Button.BUTTON_L: 10,
+    enums.Button.BUTTON_R: 11, enums.Button.BUTTON_START: 0, enums.Button.BUTTON_D_UP: 6,
+    enums.Button.BUTTON_D_DOWN: 7, enums.Button.BUTTON_D_LEFT: 8, enums.Button.BUTTON_D_RIGHT: 9}
+#Where each analog value's byte starts
+L_SHIFT = 16
+R_SHIFT = 24
+MAIN_X_SHIFT = 32
+MAIN_Y_SHIFT = 40
+C_X_SHIFT = 48
+C_Y_SHIFT = 56
+BUTTON_MASK = 0xfff
+#The GameCube's analog values are bytes. 128 is the middle of a stick
+STICK_CENTER = 128
+#Every analog value the GameCube can have, as a float from 0 to 1. The center
+#   reads back as exactly .5, so that neutral stays neutral
+ANALOG_VALUES = [value / 255 for value in range(256)]
+ANALOG_VALUES[STICK_CENTER] = .5
+#The same, ready to go into a command
+ANALOG_STRINGS = [str(value) for value in ANALOG_VALUES]
+#Everything let go, and the sticks in the middle
+NEUTRAL_VALUE = (STICK_CENTER << MAIN_X_SHIFT) | (STICK_CENTER << MAIN_Y_SHIFT) | \
+    (STICK_CENTER << C_X_SHIFT) | (STICK_CENTER << C_Y_SHIFT)
+
+"""Round an analog value from 0 to 1 onto the GameCube's grid of bytes"""
+def quantize(value):
+    if value <= 0:
+        return 0
+    if value >= 1:
+        return 255
+    return int(value * 255 + .5)
+
+"""The digital buttons of a ControllerState, as a dict-like view of its bits
+    Only lives as long as it's being used, so reach for it as state.button"""
+class ButtonMap(MutableMapping):
+    __slots__ = ["state"]
+
+    def __init__(self, state):
+        self.state = state
+
+    def __getitem__(self, button):
+        return bool(self.state.value >> BUTTON_BITS[button] & 1)
+
+    def __setitem__(self, button, pressed):
+        if pressed:
+            self.state.value |= 1 << BUTTON_BITS[button]
+        else:
+            self.state.value &= ~(1 << BUTTON_BITS[button])
+
+    def __delitem__(self, button):
+        raise TypeError("Buttons can't be removed from a controller")
+
+    def __iter__(self):
+        return iter(BUTTON_BITS)
+
+    def __len__(self):
+        return len(BUTTON_BITS)
+
+"""A snapshot of the state of a virtual controller
+    The whole thing is packed into a single 64 bit integer, in value. Buttons
+    are in the low 12 bits, and each analog value gets a byte, so the sticks
+    and shoulders are rounded onto the GameCube's own 8 bit grid. Comparing
+    and hashing states just compares and hashes value
+    NOTE: Don't change a state while it's in a set or being used as a dict key
+    value = The packed state to start with. Defaults to neutral"""
 class ControllerState:
-    def __init__(self):
-        self.button = dict()
-        #Boolean buttons
-        self.button[enums.Button.BUTTON_A] = False
-        self.button[enums.Button.BUTTON_B] = False
-        self.button[enums.Button.BUTTON_X] = False
-        self.button[enums.Button.BUTTON_Y] = False
-        self.button[enums.Button.BUTTON_Z] = False
-        self.button[enums.Button.BUTTON_L] = False
-        self.button[enums.Button.BUTTON_R] = False
-        self.button[enums.Button.BUTTON_START] = False
-        self.button[enums.Button.BUTTON_D_UP] = False
-        self.button[enums.Button.BUTTON_D_DOWN] = False
-        self.button[enums.Button.BUTTON_D_LEFT] = False
-        self.button[enums.Button.BUTTON_D_RIGHT] = False
-        #Analog sticks
-        self.main_stick = (.5, .5)
-        self.c_stick = (.5, .5)
-        #Analog shoulders
-        self.l_shoulder = 0
-        self.r_shoulder = 0
+    __slots__ = ["value"]
+
+    def __init__(self, value=NEUTRAL_VALUE):
+        self.value = value
+
+    """Dict-like view of the digital buttons, of Button to bool"""
+    @property
+    def button(self):
+        return ButtonMap(self)
+
+    @property
+    def main_stick(self):
+        value = self.value
+        return (ANALOG_VALUES[value >> MAIN_X_SHIFT & 0xff], ANALOG_VALUES[value >> MAIN_Y_SHIFT & 0xff])
+
+    @main_stick.setter
+    def main_stick(self, stick):
+        self.value = (self.value & ~(0xffff << MAIN_X_SHIFT)) | \
+            (quantize(stick[0]) << MAIN_X_SHIFT) | (quantize(stick[1]) << MAIN_Y_SHIFT)
+
+    @property
+    def c_stick(self):
+        value = self.value
+        return (ANALOG_VALUES[value >> C_X_SHIFT & 0xff], ANALOG_VALUES[value >> C_Y_SHIFT & 0xff])
+
+    @c_stick.setter
+    def c_stick(self, stick):
+        self.value = (self.value & ~(0xffff << C_X_SHIFT)) | \
+            (quantize(stick[0]) << C_X_SHIFT) | (quantize(stick[1]) << C_Y_SHIFT)
+
+    @property
+    def l_shoulder(self):
+        return ANALOG_VALUES[self.value >> L_SHIFT & 0xff]
+
+    @l_shoulder.setter
+    def l_shoulder(self, amount):
+        self.value = (self.value & ~(0xff << L_SHIFT)) | (quantize(amount) << L_SHIFT)
+
+    @property
+    def r_shoulder(self):
+        return ANALOG_VALUES[self.value >> R_SHIFT & 0xff]
+
+    @r_shoulder.setter
+    def r_shoulder(self, amount):
+        self.value = (self.value & ~(0xff << R_SHIFT)) | (quantize(amount) << R_SHIFT)
+
+    """Copy over another controller state, without making a new one"""
+    def copyfrom(self, other):
+        self.value = other.value
+
+    """The commands that would take dolphin from neutral to this state"""
+    def commands(self):
+        return changecommands(self.value, None)
+
+    def __eq__(self, other):
+        if not isinstance(other, ControllerState):
+            return NotImplemented
+        return self.value == other.value
+
+    def __hash__(self):
+        return hash(self.value)
 
     def __str__(self):
         string = ""
@@ -36,19 +149,216 @@ class ControllerState:
         string += "R_SHOULDER: " + str(self.r_shoulder) + "\n"
         return string
 
-"""Utility class that manages virtual controller state and button presses"""
+#Every command for the digital buttons, made ahead of time so that we're not
+#   building the same strings over and over again each frame
+PRESS_COMMANDS = {button: "PRESS " + button.value + "\n" for button in enums.Button}
+RELEASE_COMMANDS = {button: "RELEASE " + button.value + "\n" for button in enums.Button}
+#The buttons that simple_press() presses and releases. Not the sticks
+SIMPLE_BUTTONS = tuple(button for button in enums.Button \
+    if button not in [enums.Button.BUTTON_MAIN, enums.Button.BUTTON_C])
+#Puts every button and stick back to neutral
+EMPTY_INPUT = "RELEASE A\nRELEASE B\nRELEASE X\nRELEASE Y\nRELEASE Z\nRELEASE L\n" \
+    "RELEASE R\nRELEASE START\nRELEASE D_UP\nRELEASE D_DOWN\nRELEASE D_LEFT\n" \
+    "RELEASE D_RIGHT\nSET MAIN .5 .5\nSET C .5 .5\nSET L 0\nSET R 0\n"
+#Tells dolphin that's all the input for this frame, in lockstep mode
+FLUSH_COMMAND = "FLUSH\n"
+#How many seconds a flush waits for room in a full pipe by default. A few
+#   frames, so a stuck dolphin can't hang the bot
+WRITE_TIMEOUT = 4 / 60
+#How many seconds connect() waits for dolphin to open its end of the pipe, by default
+CONNECT_TIMEOUT = 10
+"""The commands that take a controller from one packed state to another
+    Bots tend to go back and forth between the same few states, so these are
+    kept around rather than built again every time
+    sent = The packed state dolphin has now, or None if we don't know
+    Returns them all as one string, which is empty if nothing changed"""
+@functools.lru_cache(maxsize=4096)
+def changecommands(current, sent):
+    if sent is None:
+        #Don't know what dolphin has, so start over from neutral
+        return EMPTY_INPUT + changecommands(current, NEUTRAL_VALUE)
+    changed = current ^ sent
+    if not changed:
+        return ""
+    commands = []
+    if changed & BUTTON_MASK:
+        for button, bit in BUTTON_BITS.items():
+            if changed >> bit & 1:
+                commands.append(PRESS_COMMANDS[button] if current >> bit & 1 else RELEASE_COMMANDS[button])
+    if changed >> MAIN_X_SHIFT & 0xffff:
+        commands.append("SET MAIN " + ANALOG_STRINGS[current >> MAIN_X_SHIFT & 0xff] + " " + \
+            ANALOG_STRINGS[current >> MAIN_Y_SHIFT & 0xff] + "\n")
+    if changed >> C_X_SHIFT & 0xffff:
+        commands.append("SET C " + ANALOG_STRINGS[current >> C_X_SHIFT & 0xff] + " " + \
+            ANALOG_STRINGS[current >> C_Y_SHIFT & 0xff] + "\n")
+    if changed >> L_SHIFT & 0xff:
+        commands.append("SET L " + ANALOG_STRINGS[current >> L_SHIFT & 0xff] + "\n")
+    if changed >> R_SHIFT & 0xff:
+        commands.append("SET R " + ANALOG_STRINGS[current >> R_SHIFT & 0xff] + "\n")
+    return "".join(commands)
+
+"""Holds on to commands for a pipe opened in non-blocking mode, so that writing
+    them out never blocks for longer than it's allowed to. Has just enough of
+    a file's interface for Controller to use it in place of one"""
+class Pipe:
+    def __init__(self, fd):
+        self.fd = fd
+        self.buffer = bytearray()
+        #Whether the start of the buffer is partway through a command, because
+        #   only some of it fit in the pipe
+        self.midcommand = False
+
+    def write(self, command):
+        self.buffer += command.encode()
+
+    """Write out as much as the pipe has room for right now"""
+    def send(self):
+        try:
+            written = os.write(self.fd, self.buffer)
+        except BlockingIOError:
+            return
+        if written:
+            self.midcommand = self.buffer[written - 1] != ord("\n")
+            del self.buffer[:written]
+
+    """Throw away the commands still waiting to go out, except for the rest of
+        one that's partly written already. So that the buffer doesn't keep
+        growing while dolphin isn't reading"""
+    def discard(self):
+        if self.midcommand:
+            del self.buffer[self.buffer.index(b"\n") + 1:]
+        else:
+            self.buffer.clear()
+
+    """Write out everything, waiting for room in the pipe if need be
+        timeout = The most seconds to wait for room. None waits forever. If it
+            runs out, whatever's left stays queued for the next flush
+        Returns how many seconds were spent waiting for room"""
+    def flush(self, timeout=None):
+        self.send()
+        if not self.buffer:
+            return 0
+        start = time.perf_counter()
+        while self.buffer:
+            wait = None
+            if timeout is not None:
+                wait = start + timeout - time.perf_counter()
+                if wait <= 0:
+                    break
+            select.select([], [self.fd], [], wait)
+            self.send()
+        return time.perf_counter() - start
+
+    """Write out everything, waiting for room in the pipe on the event loop
+        timeout = Same as for flush()
+        Returns how many seconds were spent waiting for room"""
+    async def flush_async(self, timeout=None):
+        self.send()
+        if not self.buffer:
+            return 0
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        while self.buffer:
+            wait = None
+            if timeout is not None:
+                wait = start + timeout - time.perf_counter()
+                if wait <= 0:
+                    break
+            writable = loop.create_future()
+            loop.add_writer(self.fd, lambda: writable.done() or writable.set_result(None))
+            try:
+                await asyncio.wait_for(writable, wait)
+            except asyncio.TimeoutError:
+                break
+            finally:
+                loop.remove_writer(self.fd)
+            self.send()
+        return time.perf_counter() - start
+
+    def close(self):
+        os.close(self.fd)
+
+"""Open the writing end of a controller pipe without blocking. Raises
+    OSError with ENXIO if dolphin doesn't have the other end open yet"""
+def openpipe(path):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_NONBLOCK, 0o666)
+    return Pipe(fd)
+
+"""Utility class that manages virtual controller state and button presses
+    Pressing buttons and such only changes the current state. Nothing goes to
+    dolphin until flush(), which sends just what changed since the last flush,
+    all in one write
+    steady = Copy the current state into prev on each flush, rather than
+        making a new ControllerState every frame. So prev changes in place
+    write_timeout = The most seconds a flush waits for dolphin to make room in
+        the pipe. None waits forever. If anything doesn't fit in time, the next
+        flush throws it away and sends the whole state instead, so nothing
+        piles up while dolphin isn't reading. Defaults to WRITE_TIMEOUT
+    latency = A melee.latency.LatencyTracker to stamp each flushed input with"""
 class Controller:
-    def __init__(self, dolphin, port):
+    def __init__(self, dolphin, port, steady=False, write_timeout=WRITE_TIMEOUT, latency=None):
+        self.port = port
         self.pipe_path = dolphin.get_dolphin_pipes_path(port)
         self.pipe = None
         self.prev = ControllerState()
         self.current = ControllerState()
+        #The packed state dolphin was last sent. None until the first flush
+        #   after connecting
+        self.sent = None
         self.logger = dolphin.logger
+        self.steady = steady
+        self.lockstep = dolphin.lockstep
+        #The MacroRun that's playing, if any
+        self.macro = None
+        self.write_timeout = write_timeout
+        self.latency = latency
+        #How many flushes found the pipe full and had to wait for dolphin
+        self.writestalls = 0
+        #How many of those gave up waiting, after write_timeout
+        self.writetimeouts = 0
+        #Total and longest time spent waiting on a full pipe, in seconds
+        self.stalltime = 0
+        self.maxstall = 0
+
+    """Connect the controller to dolphin. Dolphin has to have its end of the
+        pipe open first, so this waits for it to do so
+            timeout = The most seconds to wait for dolphin. None waits forever.
+                Defaults to CONNECT_TIMEOUT
+            retry = How long to wait between checks for dolphin, in seconds
+        Returns True if the connection was made, False on timing out"""
+    def connect(self, timeout=CONNECT_TIMEOUT, retry=0.01):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                self.pipe = openpipe(self.pipe_path)
+                break
+            except OSError as error:
+                # Nobody has the other end open yet
+                if error.errno != errno.ENXIO:
+                    raise
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(retry)
+        self.sent = None
+        return True
 
-    """Connect the controller to dolphin
-    TODO: returns True if connection was successful """
-    def connect(self):
-        self.pipe = open(self.pipe_path, "w")
+    """The same as connect(), but waits for dolphin on an asyncio event loop,
+        rather than blocking"""
+    async def connect_async(self, timeout=CONNECT_TIMEOUT, retry=0.05):
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            try:
+                self.pipe = openpipe(self.pipe_path)
+                break
+            except OSError as error:
+                if error.errno != errno.ENXIO:
+                    raise
+            if deadline is not None and loop.time() >= deadline:
+                return False
+            await asyncio.sleep(retry)
+        self.sent = None
+        return True
 
     def disconnect(self):
         if self.pipe:
@@ -74,12 +384,7 @@ class Controller:
         self.press_shoulder(enums.Button.BUTTON_L, 0)
         self.press_shoulder(enums.Button.BUTTON_R, 0)
         #Press the right button
-        for item in enums.Button:
-            #Don't do anything for the main or c-stick
-            if item == enums.Button.BUTTON_MAIN:
-                continue
-            if item == enums.Button.BUTTON_C:
-                continue
+        for item in SIMPLE_BUTTONS:
             #Press our button, release all others
             if item == button:
                 self.press_button(item)
@@ -89,89 +394,192 @@ class Controller:
     def press_button(self, button):
         if not self.pipe:
             return
-        command = "PRESS " + str(button.value) + "\n"
+        command = PRESS_COMMANDS[button]
         if self.logger:
             self.logger.log("Buttons Pressed", command, concat=True)
-        self.current.button[button] = True
-        self.pipe.write(command)
+        self.current.value |= 1 << BUTTON_BITS[button]
 
     def release_button(self, button):
         if not self.pipe:
             return
-        command = "RELEASE " + str(button.value) + "\n"
+        command = RELEASE_COMMANDS[button]
         if self.logger:
             self.logger.log("Buttons Pressed", command, concat=True)
-        self.current.button[button] = False
-        self.pipe.write(command)
+        self.current.value &= ~(1 << BUTTON_BITS[button])
 
     def press_shoulder(self, button, amount):
         if not self.pipe:
             return
-        command = "SET " + str(button.value) + " " + str(amount) + "\n"
         if self.logger:
+            command = "SET " + str(button.value) + " " + str(amount) + "\n"
             self.logger.log("Buttons Pressed", command, concat=True)
         if button == enums.Button.BUTTON_L:
             self.current.l_shoulder = amount
         elif button == enums.Button.BUTTON_R:
             self.current.r_shoulder = amount
-        self.pipe.write(command)
 
     def tilt_analog(self, button, x, y):
         if not self.pipe:
             return
-        command = "SET " + str(button.value) + " " + str(x) + " " + str(y) + "\n"
         if button == enums.Button.BUTTON_MAIN:
             self.current.main_stick = (x, y)
         else:
             self.current.c_stick = (x, y)
         if self.logger:
+            command = "SET " + str(button.value) + " " + str(x) + " " + str(y) + "\n"
             self.logger.log("Buttons Pressed", command, concat=True)
-        self.pipe.write(command)
+
+    """Start playing a macro. From now on, each flush sends the macro's inputs
+        for that frame, in place of whatever was pressed by hand, until the
+        macro ends or stop_macro() is called
+            macro = The Macro to play
+            player = The PlayerState whose action sets off the macro's triggers.
+                Keep passing the same one, it's looked at fresh each frame"""
+    def play(self, macro, player):
+        self.macro = macro.start(player)
+
+    """Stop the macro that's playing, leaving the inputs as they last were"""
+    def stop_macro(self):
+        self.macro = None
+
+    """Is a macro playing right now?"""
+    def playing(self):
+        return self.macro is not None
 
     def empty_input(self):
         if not self.pipe:
             return
-        command = "RELEASE A" + "\n"
-        command += "RELEASE B" + "\n"
-        command += "RELEASE X" + "\n"
-        command += "RELEASE Y" + "\n"
-        command += "RELEASE Z" + "\n"
-        command += "RELEASE L" + "\n"
-        command += "RELEASE R" + "\n"
-        command += "RELEASE START" + "\n"
-        command += "RELEASE D_UP" + "\n"
-        command += "RELEASE D_DOWN" + "\n"
-        command += "RELEASE D_LEFT" + "\n"
-        command += "RELEASE D_RIGHT" + "\n"
-        command += "SET MAIN .5 .5" + "\n"
-        command += "SET C .5 .5" + "\n"
-        command += "SET L 0" + "\n"
-        command += "SET R 0" + "\n"
         #Set the internal state back to neutral
-        self.current.button[enums.Button.BUTTON_A] = False
-        self.current.button[enums.Button.BUTTON_B] = False
-        self.current.button[enums.Button.BUTTON_X] = False
-        self.current.button[enums.Button.BUTTON_Y] = False
-        self.current.button[enums.Button.BUTTON_Z] = False
-        self.current.button[enums.Button.BUTTON_L] = False
-        self.current.button[enums.Button.BUTTON_R] = False
-        self.current.button[enums.Button.BUTTON_START] = False
-        self.current.button[enums.Button.BUTTON_D_UP] = False
-        self.current.button[enums.Button.BUTTON_D_DOWN] = False
-        self.current.button[enums.Button.BUTTON_D_LEFT] = False
-        self.current.button[enums.Button.BUTTON_D_RIGHT] = False
-        self.current.main_stick = (.5, .5)
-        self.current.c_stick = (.5, .5)
-        self.current.l_shoulder = 0
-        self.current.r_shoulder = 0
-        #Send the presses to dolphin
-        self.pipe.write(command)
+        self.current.value = NEUTRAL_VALUE
         if self.logger:
             self.logger.log("Buttons Pressed", "Empty Input", concat=True)
 
+    """Send this frame's inputs off to dolphin. In lockstep mode, this is what
+        lets dolphin move on to the next frame"""
     def flush(self):
         if not self.pipe:
             return
-        self.pipe.flush()
-        #Move the current controller state into the previous one
-        self.prev = copy.copy(self.current)
+        self.writechanges()
+        waited = self.pipe.flush(self.write_timeout)
+        if waited:
+            self.stalled(waited)
+        self.updateprev()
+
+    """Queue up the commands for everything that changed since the last flush"""
+    def writechanges(self):
+        previous = self.sent
+        if self.pipe.buffer:
+            #The last flush didn't all go out. Rather than pile this frame's
+            #   changes on top, start over with the whole state
+            self.pipe.discard()
+            self.sent = None
+        if self.macro is not None:
+            value = self.macro.next()
+            if value is None:
+                self.macro = None
+            else:
+                self.current.value = value
+        command = changecommands(self.current.value, self.sent)
+        if self.lockstep:
+            command += FLUSH_COMMAND
+        if command:
+            self.pipe.write(command)
+        if self.latency is not None and self.current.value != previous:
+            self.latency.flushed(self.port, self.current.value, previous)
+        self.sent = self.current.value
+
+    """Count up a flush that had to wait for room in the pipe
+        waited = How many seconds it waited for"""
+    def stalled(self, waited):
+        self.writestalls += 1
+        self.stalltime += waited
+        self.maxstall = max(self.maxstall, waited)
+        if self.pipe.buffer:
+            self.writetimeouts += 1
+        if self.logger:
+            self.logger.log("Notes", "Pipe stalled for %.1fms " % (waited * 1000), concat=True)
+
+    """Move the current controller state into the previous one"""
+    def updateprev(self):
+        if self.steady:
+            self.prev.copyfrom(self.current)
+        else:
+            self.prev = copy.copy(self.current)
+
+    """The same as flush(), but if the pipe is full, waits for dolphin to make
+        room on an asyncio event loop rather than blocking"""
+    async def flush_async(self):
+        if not self.pipe:
+            return
+        self.writechanges()
+        waited = await self.pipe.flush_async(self.write_timeout)
+        if waited:
+            self.stalled(waited)
+        self.updateprev()
+
+"""A Controller for every port in dolphin's ai_ports, flushed together
+    Each frame's inputs for all of them get worked out first, then written out
+    in one go, so that they all land in the same frame. Otherwise a slow pipe
+    for one port could push the others' inputs back a frame
+    steady, latency = Same as for Controller
+    write_timeout = Same as for Controller, but shared between all the pipes"""
+class ControllerGroup:
+    def __init__(self, dolphin, steady=False, write_timeout=WRITE_TIMEOUT, latency=None):
+        self.controllers = [Controller(dolphin, port, steady, latency=latency) \
+            for port in dolphin.ai_ports]
+        #Dict of port to Controller
+        self.ports = {controller.port: controller for controller in self.controllers}
+        self.write_timeout = write_timeout
+
+    def __getitem__(self, port):
+        return self.ports[port]
+
+    def __iter__(self):
+        return iter(self.controllers)
+
+    def __len__(self):
+        return len(self.controllers)
+
+    """Connect every controller to dolphin
+        timeout = The most seconds to wait for dolphin, in all
+        Returns True if they all connected"""
+    def connect(self, timeout=CONNECT_TIMEOUT):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for controller in self.controllers:
+            left = None if deadline is None else max(0, deadline - time.monotonic())
+            if not controller.connect(left):
+                return False
+        return True
+
+    def disconnect(self):
+        for controller in self.controllers:
+            controller.disconnect()
+
+    """Send every port's inputs for this frame off to dolphin, all at once"""
+    def flush(self):
+        connected = [controller for controller in self.controllers if controller.pipe]
+        for controller in connected:
+            controller.writechanges()
+        for controller in connected:
+            controller.pipe.send()
+        waiting = [controller for controller in connected if controller.pipe.buffer]
+        if waiting:
+            start = time.perf_counter()
+            stalled = list(waiting)
+            #Wait for room in whichever pipes are full, all at the same time
+            while waiting:
+                wait = None
+                if self.write_timeout is not None:
+                    wait = start + self.write_timeout - time.perf_counter()
+                    if wait <= 0:
+                        break
+                writable = select.select([], [controller.pipe.fd for controller in waiting], [], wait)[1]
+                for controller in waiting:
+                    if controller.pipe.fd in writable:
+                        controller.pipe.send()
+                waiting = [controller for controller in waiting if controller.pipe.buffer]
+            waited = time.perf_counter() - start
+            for controller in stalled:
+                controller.stalled(waited)
+        for controller in connected:
+            controller.updateprev()
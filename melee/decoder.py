@@ -0,0 +1,171 @@
+"""Table-driven decoding of MemoryWatcher updates
+Every watched address is compiled once, at startup, into a Field that knows
+how to turn the raw payload into a value and where to store it. This way we
+don't have to walk a chain of string comparisons for every single update.
+What gets decoded, and how, is described in melee/schema.py"""
+from melee.schema import SPECS, SUBPLAYER_PERCENT
+from melee import schema
+import binascii
+import struct
+from collections import defaultdict
+
+"""Split a raw datagram from dolphin into an (address, value) tuple
+    address is the string provided by dolphin, set in Locations.txt.
+    value is a four-byte string suitable for interpretation with struct."""
+def parsedatagram(data):
+    address, _, value = data.partition(b'\n')
+    # Strip the null terminator, pad with zeros, then convert to bytes
+    return address.decode('utf-8'), binascii.unhexlify(value.rstrip(b'\x00').zfill(8))
+
+"""Represents how to decode one watched address"""
+class Field:
+    def __init__(self, name, address, player, fmt, shift=0, mask=0, convert=None,
+            attribute=None, previous=None, handler=None, offset=0):
+        self.name = name
+        self.address = address
+        #Player index the value belongs to. 0 means the GameState itself
+        self.player = player
+        self.struct = struct.Struct(fmt)
+        self.unpack = self.struct.unpack_from
+        #Where the value sits in the payload. Only nonzero inside a Block
+        self.offset = offset
+        self.shift = shift
+        self.mask = mask
+        self.convert = convert
+        #Which attribute the decoded value is stored in
+        self.attribute = attribute or name
+        #If set, the old value is copied into this attribute before storing
+        self.previous = previous
+        #Name of a GameState method, for updates that need more than a store
+        self.handler = handler
+        #The object the value is stored on. Filled in by the GameState
+        self.target = None
+        #Where payloads wait to be decoded, for lazy players. None to decode now
+        self.pending = None
+
+    """Turn a raw payload into the value to be stored
+        Raises ValueError if the value should be left alone"""
+    def decode(self, payload):
+        value = self.unpack(payload, self.offset)[0]
+        if self.shift:
+            value >>= self.shift
+        if self.mask:
+            value &= self.mask
+        if self.convert is not None:
+            value = self.convert(value)
+        return value
+
+"""Build a single Field for the given label, address and player
+    offset = Where the field sits inside of a Block, if it's read as part of one"""
+def makefield(name, address, player, offset=None):
+    spec = SPECS[name]
+    if name == "percent" and player > 4:
+        spec = SUBPLAYER_PERCENT
+    fmt, shift, mask, convert, attribute, previous, handler = spec
+    if offset is None:
+        offset = 0
+    else:
+        fmt = swapbyteorder(fmt)
+    return Field(name, address, player, fmt, shift, mask, convert, attribute,
+        previous, handler, offset)
+
+"""Single reads come to us with their bytes swapped around, but blocks come
+    straight out of (big endian) memory. So flip the byte order around to match"""
+def swapbyteorder(fmt):
+    if fmt[0] == '<':
+        return '>' + fmt[1:]
+    if fmt[0] == '>':
+        return '<' + fmt[1:]
+    #Native byte order, which is little endian on anything we run on
+    return '>' + fmt
+
+"""Represents a chunk of memory that holds several fields, read all at once"""
+class Block:
+    def __init__(self, address, size, members):
+        self.address = address
+        #How many bytes to read
+        self.size = size
+        #List of Fields inside of this block
+        self.members = members
+        #Blocks look enough like a Field for GameState to dispatch them
+        self.name = "block"
+        self.player = 0
+        self.previous = None
+        self.pending = None
+        self.handler = "updateblock"
+        self.target = None
+
+#Fields closer together than this many bytes get read in the same block
+BLOCK_GAP = 0x200
+#These labels need to keep coming in on their own
+UNBLOCKABLE = ["frame", "projectiles", "menu_state", "stage"]
+
+"""Split an address from Locations.txt into the pointers to follow, and the
+    final offset. Plain addresses have no pointers"""
+def splitaddress(address):
+    parts = address.split(" ")
+    return " ".join(parts[:-1]), int(parts[-1], 16)
+
+"""Group up fields that sit close together in memory, so that each group can
+    be read with a single datagram instead of one per field. This needs a
+    MemoryWatcher that understands sized reads, written as "address:size"
+    Returns a new dispatch table"""
+def compileblocks(fields):
+    runs = defaultdict(list)
+    blocks = dict()
+    for address, field in fields.items():
+        if field.name in UNBLOCKABLE:
+            blocks[address] = field
+            continue
+        pointers, offset = splitaddress(address)
+        runs[pointers].append((offset, field))
+    for pointers, members in runs.items():
+        members.sort(key=lambda member: member[0])
+        run = []
+        for offset, field in members:
+            if run and offset - run[-1][0] > BLOCK_GAP:
+                addblock(blocks, pointers, run)
+                run = []
+            run.append((offset, field))
+        addblock(blocks, pointers, run)
+    return blocks
+
+"""Make a Block out of a run of nearby fields, and add it to the dispatch table"""
+def addblock(blocks, pointers, run):
+    # There's no point in a block of one
+    if len(run) == 1:
+        blocks[run[0][1].address] = run[0][1]
+        return
+    start = run[0][0]
+    size = run[-1][0] + run[-1][1].struct.size - start
+    if pointers:
+        address = "%s %x:%x" % (pointers, start, size)
+    else:
+        address = "%08x:%x" % (start, size)
+    members = [makefield(field.name, field.address, field.player, offset - start) \
+        for offset, field in run]
+    blocks[address] = Block(address, size, members)
+
+"""Every Field in the dispatch table, including the ones inside of blocks"""
+def allfields(fields):
+    for field in fields.values():
+        if isinstance(field, Block):
+            for member in field.members:
+                yield member
+        else:
+            yield field
+
+"""Write out a Locations.txt for dolphin that watches the given dispatch table"""
+def writelocations(path, fields):
+    with open(path, "w") as outfile:
+        for address in fields:
+            outfile.write(address + "\n")
+
+"""Compile the schema into a dispatch table
+    names = List of labels to watch, or None for all of them
+    Returns a dict with key of address, and value of Field"""
+def compilelocations(names=None):
+    fields = dict()
+    for name, address, player in schema.select(names):
+        fields[address] = makefield(name, address, player)
+    return fields
@@ -1,15 +1,34 @@
-import os, pwd, shutil, subprocess
+import os, pwd, subprocess
 import configparser
-from melee import enums
+from melee import enums, decoder
 
 """Class for making confuguration and interfacing with the Dolphin emulator easy"""
 class Dolphin:
 
-    """Do a some setup of some important dolphin paths"""
-    def __init__(self, ai_port, opponent_port, opponent_type, logger=None):
+    """Do a some setup of some important dolphin paths
+        blockread = Watch nearby fields as a single block of memory, rather than
+            one at a time. Needs a MemoryWatcher that supports sized reads.
+            This cuts down on datagrams and socket reads, not on decoding
+        fields = List of labels from melee/schema.py to watch, or None for all
+            of them. The fewer fields, the less work there is per frame
+        lockstep = Have dolphin wait at the end of each frame until the bot has
+            sent its inputs, marked by a FLUSH command on the controller pipe.
+            The game then runs as fast as the bot does, faster or slower than
+            real time, and never drops a frame. Needs a dolphin that supports it
+        ai_ports = Every port that a bot plays on, for running several bots (for
+            doubles, or self-play) from one process. ai_port is always one of
+            them. Defaults to just ai_port"""
+    def __init__(self, ai_port, opponent_port, opponent_type, logger=None, blockread=False,
+            fields=None, lockstep=False, ai_ports=None):
         self.ai_port = ai_port
+        self.ai_ports = [ai_port] + [port for port in ai_ports or [] if port != ai_port]
+        if len(self.ai_ports) > 4:
+            raise ValueError("Melee only has 4 controller ports")
         self.opponent_port = opponent_port
         self.logger = logger
+        self.blockread = blockread
+        self.fields = fields
+        self.lockstep = lockstep
         self.process = None
         config_path = self.get_dolphin_home_path()
         mem_watcher_path = config_path + "MemoryWatcher/"
@@ -22,9 +41,11 @@ class Dolphin:
                 "You may need to restart Dolphin and this program in order for this to work. " \
                 "(You should only see this warning once)")
 
-        #Copy over Locations.txt that is adjacent to this file
-        path = os.path.dirname(os.path.realpath(__file__))
-        shutil.copy(path + "/Locations.txt", mem_watcher_path)
+        #Write out a Locations.txt with just the fields we want
+        watched = decoder.compilelocations(fields)
+        if blockread:
+            watched = decoder.compileblocks(watched)
+        decoder.writelocations(mem_watcher_path + "Locations.txt", watched)
 
         #Create the Pipes directory if it doesn't already exist
         if not os.path.exists(pipes_path):
@@ -33,13 +54,16 @@ class Dolphin:
                 "You may need to restart Dolphin and this program in order for this to work. " \
                 "(You should only see this warning once)")
 
-        pipes_path += "Bot" + str(ai_port)
-        if not os.path.exists(pipes_path):
-            os.mkfifo(pipes_path)
+        for port in self.ai_ports:
+            if not os.path.exists(pipes_path + "Bot" + str(port)):
+                os.mkfifo(pipes_path + "Bot" + str(port))
 
         #setup the controllers specified
-        self.setup_controller(ai_port)
-        self.setup_controller(opponent_port, opponent_type)
+        for port in self.ai_ports:
+            self.setup_controller(port)
+        #In self-play, the opponent is one of our own bots
+        if opponent_port not in self.ai_ports:
+            self.setup_controller(opponent_port, opponent_type)
 
     """Setup the necessary files for dolphin to recognize the player at the given
     controller port and type"""
@@ -0,0 +1,515 @@
+"""A stand-in for dolphin, for running and benchmarking without the emulator
+FakeDolphin looks enough like melee.dolphin.Dolphin to make a GameState out
+of, and ReplayServer sends memory updates to that GameState's socket the same
+way dolphin's MemoryWatcher would. The updates either come from a recording
+made with melee.recorder, or are made up on the spot.
+
+It can also be run on its own, alongside a bot that's using a real Dolphin
+object, like so:
+    python -m melee.fakedolphin --recording match.rec --speed 2"""
+from melee import decoder, enums
+from melee.controller import ControllerState
+from melee.recorder import Recording
+import argparse
+import binascii
+import multiprocessing
+import os
+import select
+import socket
+import struct
+import tempfile
+import time
+
+#How long one frame takes, at normal speed
+FRAMETIME = 1 / 60
+#The frame counter. Dolphin sends it last, once everything else for the frame is in
+FRAME_ADDRESS = "00479D60"
+
+"""Looks like a Dolphin, but everything lives in a scratch directory
+    path = Directory to put the MemoryWatcher socket in. Defaults to a new
+        temporary directory
+    pipes = Make a real pipe for the bot's controller, like dolphin does, for a
+        ClosedLoopServer to read from. Otherwise controller commands just get
+        thrown away
+    lockstep = Same as for Dolphin. Only a ClosedLoopServer pays attention to it
+    ai_ports = Same as for Dolphin. Each one gets its own pipe"""
+class FakeDolphin:
+    def __init__(self, ai_port=2, opponent_port=1, logger=None, blockread=False,
+            fields=None, path=None, pipes=False, lockstep=False, ai_ports=None):
+        self.ai_port = ai_port
+        self.ai_ports = [ai_port] + [port for port in ai_ports or [] if port != ai_port]
+        self.opponent_port = opponent_port
+        self.logger = logger
+        self.blockread = blockread
+        self.fields = fields
+        self.lockstep = lockstep
+        if path is None:
+            path = tempfile.mkdtemp()
+        self.path = path
+        self.pipes = pipes
+        if pipes:
+            os.makedirs(os.path.join(path, "Pipes"), exist_ok=True)
+            for port in self.ai_ports:
+                if not os.path.exists(self.get_dolphin_pipes_path(port)):
+                    os.mkfifo(self.get_dolphin_pipes_path(port))
+
+    """Get the MemoryWatcher socket path"""
+    def get_memory_watcher_socket_path(self):
+        return os.path.join(self.path, "MemoryWatcher")
+
+    """Get the path of the named pipe input file for the given controller port"""
+    def get_dolphin_pipes_path(self, port):
+        if not self.pipes:
+            return os.devnull
+        return os.path.join(self.path, "Pipes", "Bot" + str(port))
+
+"""Turn an (address, value) update into a datagram, as dolphin would send it"""
+def makedatagram(address, value):
+    return address.encode() + b"\n" + binascii.hexlify(value) + b"\x00"
+
+"""Make a list of (address, value) updates for one frame, the same as what
+    dolphin would send. The frame counter always comes last"""
+def syntheticframe(frame, blockread=False, fields=None):
+    updates = []
+    fields = decoder.compilelocations(fields)
+    if blockread:
+        fields = decoder.compileblocks(fields)
+    for address, field in fields.items():
+        if field.name == "frame":
+            continue
+        if isinstance(field, decoder.Block):
+            # Blocks are straight out of memory, so the bytes are the other way around
+            block = bytearray(field.size)
+            for member in field.members:
+                struct.pack_into('>I', block, member.offset, (frame + len(updates)) % 3)
+            updates.append((address, bytes(block)))
+        else:
+            updates.append((address, struct.pack('<I', (frame + len(updates)) % 3)))
+    updates.append((FRAME_ADDRESS, struct.pack('<I', frame)))
+    return updates
+
+"""Made up frames, one after another. Cycles through a second's worth of
+    different values, but the frame counter keeps going up
+    count = How many frames to make, or None to go on forever
+    Yields (when to send it in seconds, list of datagrams) for each frame"""
+def syntheticframes(count=None, blockread=False, fields=None):
+    datagrams = [[makedatagram(address, value) for address, value \
+        in syntheticframe(i, blockread, fields)[:-1]] for i in range(60)]
+    frame = 0
+    while count is None or frame < count:
+        yield frame * FRAMETIME, datagrams[frame % 60] + \
+            [makedatagram(FRAME_ADDRESS, struct.pack('<I', frame))]
+        frame += 1
+
+"""The frames from a recording made with melee.recorder, keeping their timing
+    count = How many frames to play, or None for all of them
+    Yields (when to send it in seconds, list of datagrams) for each frame"""
+def recordedframes(path, count=None):
+    recording = Recording(path)
+    start = None
+    #Go by where each frame sits in the log, since frame counters start over
+    #   with each game
+    for frame, framestart, frameend in recording.index[:count]:
+        datagrams = []
+        arrival = None
+        for arrival, address, value in recording.records(framestart, frameend):
+            if start is None:
+                start = arrival
+            datagrams.append(makedatagram(address, value))
+        if arrival is None:
+            continue
+        yield (arrival - start) / 1e9, datagrams
+    recording.close()
+
+"""Plays memory updates at a GameState's socket, like dolphin does
+    path = The socket to send to (Dolphin.get_memory_watcher_socket_path())
+    recording = A log written by melee.recorder to play back. If None, frames
+        are made up instead
+    frames = How many frames to send. None for the whole recording, or to keep
+        going until stopped if there isn't one
+    speed = How fast to go, as a multiple of real time. 0 sends as fast as the
+        socket will take them
+    block = Wait for room on the socket if the bot falls behind, rather than
+        throwing the update away. Thrown away updates are counted in dropped
+    blockread, fields = Which frames to make up. Same as for Dolphin
+
+    Use start() to run it in its own process, or run() to run it right here.
+    sent, dropped and started are shared with the process, so they can be
+    watched from outside of it while it's going"""
+class ReplayServer:
+    def __init__(self, path, recording=None, frames=None, speed=1, block=True,
+            blockread=False, fields=None):
+        self.path = path
+        self.recording = recording
+        self.frames = frames
+        self.speed = speed
+        self.block = block
+        self.blockread = blockread
+        self.fields = fields
+        #How many frames have been sent in full
+        self.sent = multiprocessing.Value('q', 0)
+        #How many datagrams got thrown away because the socket was full
+        self.dropped = multiprocessing.Value('q', 0)
+        #time.monotonic() of when the first frame went out
+        self.started = multiprocessing.Value('d', 0)
+        self.stopping = multiprocessing.Event()
+        self.process = None
+
+    """Start sending in a separate process"""
+    def start(self):
+        self.process = multiprocessing.Process(target=self.run, daemon=True)
+        self.process.start()
+
+    """Stop sending, and wait for the process to finish up"""
+    def stop(self):
+        self.stopping.set()
+        self.join()
+
+    """Wait for everything to be sent"""
+    def join(self):
+        if self.process is not None:
+            self.process.join()
+            self.process = None
+
+    """When the given frame (counting from 0) was due to go out, in time.monotonic()
+        terms. Only makes sense for made up frames, at some speed other than 0"""
+    def due(self, frame):
+        return self.started.value + frame * FRAMETIME / self.speed
+
+    """Where the frames come from"""
+    def source(self):
+        if self.recording is not None:
+            return recordedframes(self.recording, self.frames)
+        return syntheticframes(self.frames, self.blockread, self.fields)
+
+    """Send everything, right here. Returns once it's all been sent, or stop() is called"""
+    def run(self):
+        sock = self.connect()
+        if sock is None:
+            return
+        start = time.monotonic()
+        self.started.value = start
+        for when, datagrams in self.source():
+            if self.speed:
+                delay = start + when / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            for datagram in datagrams:
+                if not self.send(sock, datagram):
+                    sock.close()
+                    return
+            self.sent.value += 1
+            if self.stopping.is_set():
+                break
+        sock.close()
+
+    """Send one datagram. Returns False if the bot went away, or we got
+        stopped while waiting on it"""
+    def send(self, sock, datagram):
+        while True:
+            try:
+                sock.send(datagram)
+                return True
+            except BlockingIOError:
+                self.dropped.value += 1
+                return True
+            except socket.timeout:
+                if self.stopping.is_set():
+                    return False
+            except (ConnectionRefusedError, FileNotFoundError):
+                return False
+
+    """Wait for the GameState to make its socket, then connect to it
+        Being connected means that waiting for room on the socket is a proper
+        wait, rather than a spin. Returns None if stopped before then"""
+    def connect(self):
+        while not self.stopping.is_set():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            try:
+                sock.connect(self.path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                sock.close()
+                time.sleep(0.001)
+                continue
+            if self.block:
+                # Don't get stuck forever once the bot stops listening
+                sock.settimeout(0.1)
+            else:
+                sock.setblocking(False)
+            return sock
+        return None
+
+#How far the scripted player moves each frame, with the stick all the way over
+DASH_SPEED = 2.0
+JUMP_SPEED = 3.0
+GRAVITY = 0.2
+#How long a jab lasts, in frames
+JAB_FRAMES = 12
+
+"""Apply one line of the controller pipe protocol to a ControllerState
+    Returns False if the line didn't make any sense"""
+def applycommand(state, line):
+    parts = line.split()
+    try:
+        if parts[0] == "PRESS":
+            state.button[enums.Button(parts[1])] = True
+        elif parts[0] == "RELEASE":
+            state.button[enums.Button(parts[1])] = False
+        elif parts[0] == "SET" and parts[1] == "MAIN":
+            state.main_stick = (float(parts[2]), float(parts[3]))
+        elif parts[0] == "SET" and parts[1] == "C":
+            state.c_stick = (float(parts[2]), float(parts[3]))
+        elif parts[0] == "SET" and parts[1] == "L":
+            state.l_shoulder = float(parts[2])
+        elif parts[0] == "SET" and parts[1] == "R":
+            state.r_shoulder = float(parts[2])
+        else:
+            return False
+    except (IndexError, ValueError):
+        return False
+    return True
+
+"""A very small stand-in for a character, moved around by a controller
+    Runs left and right with the main stick, jumps with X or Y, and jabs with A.
+    How fast it runs is stored straight in speed_ground_x_self, so a bot can
+    tell exactly when its stick input took effect"""
+class ScriptedPlayer:
+    def __init__(self, x=0):
+        self.x = x
+        self.y = 0
+        self.vx = 0
+        self.vy = 0
+        self.facing = True
+        self.on_ground = True
+        self.action = enums.Action.STANDING
+        self.action_frame = 0
+        self.jabbing = 0
+        #Buttons that were held last frame, so we only act on new presses
+        self.held = set()
+
+    """Move ahead one frame, with the given ControllerState"""
+    def step(self, controller):
+        pressed = {button for button, down in controller.button.items() if down}
+        new = pressed - self.held
+        self.held = pressed
+        stick = (controller.main_stick[0] - .5) * 2
+        action = self.action
+        if self.on_ground:
+            self.vx = stick * DASH_SPEED
+            if new & {enums.Button.BUTTON_X, enums.Button.BUTTON_Y}:
+                self.on_ground = False
+                self.vy = JUMP_SPEED
+                action = enums.Action.JUMPING_FORWARD
+            elif enums.Button.BUTTON_A in new or self.jabbing:
+                if not self.jabbing:
+                    self.jabbing = JAB_FRAMES
+                self.jabbing -= 1
+                self.vx = 0
+                action = enums.Action.NEUTRAL_ATTACK_1
+            elif abs(stick) > .3:
+                action = enums.Action.DASHING
+            else:
+                action = enums.Action.STANDING
+        else:
+            self.vy -= GRAVITY
+            self.y += self.vy
+            if self.y <= 0:
+                self.y = 0
+                self.vy = 0
+                self.on_ground = True
+                action = enums.Action.LANDING
+        if stick > .3:
+            self.facing = True
+        elif stick < -.3:
+            self.facing = False
+        self.x += self.vx
+        if action == self.action:
+            self.action_frame += 1
+        else:
+            self.action = action
+            self.action_frame = 1
+
+    """The raw values for this player's watched addresses, before any shifting
+        Dict of label to value. Anything missing is sent as zero"""
+    def values(self):
+        return {"percent": 0, "stock": 4, "facing": 0 if self.facing else 1,
+            "x": self.x, "y": self.y, "action": self.action.value,
+            "action_frame": float(self.action_frame), "on_ground": 0 if self.on_ground else 1,
+            "jumps_left": 1 if self.on_ground else 2, "speed_ground_x_self": self.vx,
+            "speed_y_self": self.vy, "character": enums.Character.FOX.value}
+
+"""Pack raw values into the payload for a field or block
+    values = Dict of player index (0 for the GameState) to dict of raw values"""
+def encodefield(field, values):
+    if isinstance(field, decoder.Block):
+        members = field.members
+        payload = bytearray(field.size)
+    else:
+        members = [field]
+        payload = bytearray(field.struct.size)
+    for member in members:
+        value = values[member.player].get(member.name, 0)
+        if member.shift:
+            value <<= member.shift
+        member.struct.pack_into(payload, member.offset, value)
+    return bytes(payload)
+
+"""A fake game that's played through the controller pipes. Reads the commands
+    that Controller writes, moves the bots' characters around with them, and
+    sends back the memory updates for each frame. So a bot can be run for real,
+    with its inputs taking effect, all without dolphin
+    dolphin = A FakeDolphin made with pipes=True
+    frames = How many frames to run for, or None to keep going until stopped
+    speed = How fast to go, as a multiple of real time. 0 for as fast as it can
+    react = Don't wait for the next frame to come around once new input shows
+        up, send it right away. Takes the emulator's own timing out of the
+        picture, when measuring how long the bot takes to see its inputs
+
+    If the dolphin is in lockstep mode, then each frame waits for the bot to
+    send FLUSH on every pipe after its inputs for the frame before. speed then
+    only caps how fast the game can go, and 0 lets it go as fast as the bot does"""
+class ClosedLoopServer(ReplayServer):
+    def __init__(self, dolphin, frames=None, speed=1, react=False):
+        ReplayServer.__init__(self, dolphin.get_memory_watcher_socket_path(), frames=frames,
+            speed=speed, blockread=dolphin.blockread, fields=dolphin.fields)
+        #Dict of port to pipe path, for every port a bot plays on
+        self.pipe_paths = {port: dolphin.get_dolphin_pipes_path(port) for port in dolphin.ai_ports}
+        self.ai_ports = dolphin.ai_ports
+        self.opponent_port = dolphin.opponent_port
+        self.react = react
+        self.lockstep = dolphin.lockstep
+        #Dict of port to whatever's left over of a line from the bot that's not
+        #   all there yet
+        self.partial = {port: b"" for port in self.ai_ports}
+
+    """Run the game, right here. Returns once it's over, or stop() is called"""
+    def run(self):
+        #Dict of port to the read end of its pipe. Open our own write ends too,
+        #   so the pipes don't look closed before the bot connects, or after it
+        #   goes away
+        pipes = {port: os.open(path, os.O_RDONLY | os.O_NONBLOCK) \
+            for port, path in self.pipe_paths.items()}
+        keepalives = [os.open(path, os.O_WRONLY) for path in self.pipe_paths.values()]
+        sock = self.connect()
+        if sock is None:
+            return
+        fields = decoder.compilelocations(self.fields)
+        if self.blockread:
+            fields = decoder.compileblocks(fields)
+        framefield = [field for field in fields.values() if field.name == "frame"][0]
+        fields = [(address, field) for address, field in fields.items() if field is not framefield]
+        controllers = {port: ControllerState() for port in self.ai_ports}
+        ports = list(self.ai_ports)
+        if self.opponent_port not in ports:
+            ports.append(self.opponent_port)
+        #Spread everyone out across the stage, alternating sides
+        players = {port: ScriptedPlayer((-20, 20, -40, 40)[i]) for i, port in enumerate(ports)}
+        idle = ControllerState()
+        interval = FRAMETIME / self.speed if self.speed else 0
+        start = time.monotonic()
+        self.started.value = start
+        due = start
+        frame = 0
+        while self.frames is None or frame < self.frames:
+            if self.lockstep:
+                if frame and not self.waitforflush(pipes, controllers):
+                    break
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                due = self.waitforinput(pipes, controllers, due)
+            for port, player in players.items():
+                player.step(controllers.get(port, idle))
+            values = {port: player.values() for port, player in players.items()}
+            values[0] = {"frame": frame, "menu_state": enums.Menu.IN_GAME.value,
+                "stage": enums.Stage.FINAL_DESTINATION.value}
+            for port in range(1, 9):
+                values.setdefault(port, {})
+            datagrams = [makedatagram(address, encodefield(field, values)) \
+                for address, field in fields]
+            datagrams.append(makedatagram(framefield.address, encodefield(framefield, values)))
+            for datagram in datagrams:
+                if not self.send(sock, datagram):
+                    self.stopping.set()
+                    break
+            if self.stopping.is_set():
+                break
+            self.sent.value += 1
+            frame += 1
+            due += interval
+        sock.close()
+        for fd in list(pipes.values()) + keepalives:
+            os.close(fd)
+
+    """Take in whatever the bot sends until it's time for the next frame, or
+        until it sends anything at all when reacting. Returns when the frame is due"""
+    def waitforinput(self, pipes, controllers, due):
+        ports = {pipe: port for port, pipe in pipes.items()}
+        while True:
+            timeout = max(0, due - time.monotonic())
+            readable = select.select(list(ports), [], [], timeout)[0]
+            for pipe in readable:
+                self.readcommands(ports[pipe], pipe, controllers[ports[pipe]])
+            if readable and self.react:
+                return time.monotonic()
+            if time.monotonic() >= due:
+                return due
+
+    """Take in what the bot sends on every pipe, up to each one's next FLUSH
+        Returns False if stop() got called while waiting"""
+    def waitforflush(self, pipes, controllers):
+        for port, pipe in pipes.items():
+            while not self.readcommands(port, pipe, controllers[port], True):
+                while not select.select([pipe], [], [], 0.1)[0]:
+                    if self.stopping.is_set():
+                        return False
+        return True
+
+    """Read everything waiting in a port's pipe, and apply it to its controller
+        untilflush = Stop at the first FLUSH, and leave the rest for next time
+        Returns True if it stopped at a FLUSH"""
+    def readcommands(self, port, pipe, controller, untilflush=False):
+        while True:
+            try:
+                data = os.read(pipe, 65536)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            self.partial[port] += data
+        while b"\n" in self.partial[port]:
+            line, self.partial[port] = self.partial[port].split(b"\n", 1)
+            if line == b"FLUSH":
+                if untilflush:
+                    return True
+                continue
+            applycommand(controller, line.decode())
+        return False
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plays memory updates at a " \
+        "GameState, in place of dolphin")
+    parser.add_argument("--socket", "-s", default=None,
+        help="MemoryWatcher socket to send to. Defaults to the one dolphin would use")
+    parser.add_argument("--recording", "-r", default=None,
+        help="Recording to play back. Makes up frames if not given")
+    parser.add_argument("--frames", "-f", type=int, default=None,
+        help="How many frames to send")
+    parser.add_argument("--speed", type=float, default=1,
+        help="Multiple of real time to play at. 0 for as fast as possible")
+    parser.add_argument("--drop", action="store_true",
+        help="Throw updates away when the bot falls behind, instead of waiting")
+    args = parser.parse_args()
+
+    path = args.socket
+    if path is None:
+        from melee.dolphin import Dolphin
+        #Only the paths are needed, so don't go through Dolphin's setup
+        path = Dolphin.__new__(Dolphin).get_memory_watcher_socket_path()
+    server = ReplayServer(path, args.recording, args.frames, args.speed, not args.drop)
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    print("Sent %d frames, dropped %d datagrams" % (server.sent.value, server.dropped.value))
@@ -1,13 +1,196 @@
 import csv
+import hashlib
+import io
 import os
 import math
+import struct
 from melee.enums import Action, Character, AttackState
 from melee import stages
 from itertools import filterfalse
 from collections import defaultdict
 
+#The fields of each frame of frame data, in the order they're kept in
+FRAME_FIELDS = ["hitbox_1_status", "hitbox_1_size", "hitbox_1_x", "hitbox_1_y",
+    "hitbox_2_status", "hitbox_2_size", "hitbox_2_x", "hitbox_2_y",
+    "hitbox_3_status", "hitbox_3_size", "hitbox_3_x", "hitbox_3_y",
+    "hitbox_4_status", "hitbox_4_size", "hitbox_4_x", "hitbox_4_y",
+    "locomotion_x", "locomotion_y", "iasa", "facing_changed", "projectile"]
+#The fields that are True or False, rather than numbers
+FLAG_FIELDS = {"hitbox_1_status", "hitbox_2_status", "hitbox_3_status", "hitbox_4_status",
+    "iasa", "facing_changed", "projectile"}
+
+#framedata.csv takes a while to parse, so it's compiled down to a packed binary
+#   file the first time it's read. The cache is rebuilt whenever the CSV's hash
+#   doesn't match the one it was built from
+CACHE_MAGIC = b"MELEEFDC"
+#Bump this whenever the layout changes, so that old caches get rebuilt
+CACHE_VERSION = 1
+#magic, version, sha256 of framedata.csv, number of rows
+CACHE_HEADER = struct.Struct("<8sI32sI")
+#character, action, action frame, then each of FRAME_FIELDS
+CACHE_ROW = struct.Struct("<HHH" + "".join("?" if name in FLAG_FIELDS else "d" \
+    for name in FRAME_FIELDS))
+#Where to keep the cache, in order of preference. The first one that can be
+#   written to gets used, since the package might be installed read only
+CACHE_PATHS = [os.path.join(os.path.dirname(os.path.realpath(__file__)), "framedata.cache"),
+    os.path.join(os.path.expanduser("~"), ".cache", "libmelee", "framedata.cache")]
+
+"""Parse framedata.csv into a list of rows. Each row is a tuple of the
+    character, action and action frame numbers, then the FRAME_FIELDS
+    data = The contents of the CSV, as a string"""
+def parseframes(data):
+    rows = []
+    for frame in csv.DictReader(io.StringIO(data)):
+        rows.append((int(frame["character"]), int(frame["action"]), int(frame["frame"])) + \
+            tuple(frame[name] == "True" if name in FLAG_FIELDS else float(frame[name]) \
+            for name in FRAME_FIELDS))
+    return rows
+
+"""Read the rows out of a cache file, in one go. Returns None if there's no
+    cache there, or it wasn't built from a CSV with the given hash"""
+def readcache(path, digest):
+    try:
+        with open(path, "rb") as cachefile:
+            data = cachefile.read()
+    except OSError:
+        return None
+    if len(data) < CACHE_HEADER.size:
+        return None
+    magic, version, cachedigest, count = CACHE_HEADER.unpack_from(data)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION or cachedigest != digest or \
+            len(data) != CACHE_HEADER.size + count * CACHE_ROW.size:
+        return None
+    return list(CACHE_ROW.iter_unpack(memoryview(data)[CACHE_HEADER.size:]))
+
+"""Write rows out to a cache file. It's written to the side and then moved into
+    place, so that other processes never see half of one
+    Returns False if the file couldn't be written"""
+def writecache(path, digest, rows):
+    temppath = path + "." + str(os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temppath, "wb") as cachefile:
+            cachefile.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, digest, len(rows)))
+            cachefile.write(b"".join(CACHE_ROW.pack(*row) for row in rows))
+        os.replace(temppath, path)
+    except OSError:
+        return False
+    return True
+
+"""Load the rows of framedata.csv, from the cache if there's a good one
+    cache = Whether to use the cache at all"""
+def loadframes(cache=True):
+    path = os.path.dirname(os.path.realpath(__file__))
+    with open(path + "/framedata.csv", "rb") as csvfile:
+        data = csvfile.read()
+    if not cache:
+        return parseframes(data.decode())
+    digest = hashlib.sha256(data).digest()
+    for cachepath in CACHE_PATHS:
+        rows = readcache(cachepath, digest)
+        if rows is not None:
+            return rows
+    rows = parseframes(data.decode())
+    for cachepath in CACHE_PATHS:
+        if writecache(cachepath, digest, rows):
+            break
+    return rows
+
+#Does this frame have a hitbox?
+def hashitbox(frame):
+    return frame['hitbox_1_status'] or frame['hitbox_2_status'] or frame['hitbox_3_status'] or \
+        frame['hitbox_4_status'] or frame['projectile']
+
+#Make a bitset out of some actions, with a bit set at each one's value
+def actionbits(actions):
+    bits = 0
+    for action in actions:
+        bits |= 1 << action.value
+    return bits
+
+#Dict of character to the bitset of actions in a category for them
+#   everyone = Actions that are in the category for every character
+#   added, removed = Dicts of character to actions that are or aren't in the
+#       category just for them
+def characterbits(everyone, added={}, removed={}):
+    return {character: (everyone | actionbits(added.get(character, []))) & \
+        ~actionbits(removed.get(character, [])) for character in Character}
+
+GRABS = characterbits(actionbits([Action.GRAB, Action.GRAB_RUNNING]), {
+    # Yea, I know. The sword dance isn't the right name
+    Character.CPTFALCON: [Action.SWORD_DANCE_3_MID, Action.SWORD_DANCE_3_LOW],
+    Character.GANONDORF: [Action.SWORD_DANCE_3_MID, Action.SWORD_DANCE_3_LOW],
+    Character.BOWSER: [Action.NEUTRAL_B_ATTACKING_AIR, Action.SWORD_DANCE_3_MID],
+    Character.YOSHI: [Action.NEUTRAL_B_CHARGING_AIR, Action.SWORD_DANCE_2_MID]})
+
+# Turns out that the actions we'd call a "roll" are fairly few. Let's just
+# hardcode them since it's just more cumbersome to do otherwise
+ROLLS = characterbits(actionbits([Action.SPOTDODGE, Action.ROLL_FORWARD, Action.ROLL_BACKWARD, \
+    Action.NEUTRAL_TECH, Action.FORWARD_TECH, Action.BACKWARD_TECH, \
+    Action.GROUND_GETUP, Action.TECH_MISS_UP, Action.TECH_MISS_DOWN, \
+    Action.EDGE_GETUP_SLOW, Action.EDGE_GETUP_QUICK, Action.EDGE_ROLL_SLOW, \
+    Action.EDGE_ROLL_QUICK, Action.GROUND_ROLL_FORWARD_UP, Action.GROUND_ROLL_BACKWARD_UP, \
+    Action.GROUND_ROLL_FORWARD_DOWN, Action.GROUND_ROLL_BACKWARD_DOWN, Action.SHIELD_BREAK_FLY, \
+    Action.SHIELD_BREAK_FALL, Action.SHIELD_BREAK_DOWN_U, Action.SHIELD_BREAK_DOWN_D, \
+    Action.SHIELD_BREAK_STAND_U, Action.SHIELD_BREAK_STAND_D, Action.TAUNT_RIGHT, Action.TAUNT_LEFT, \
+    Action.SHIELD_BREAK_TEETER]), {
+    # Marth counter
+    Character.MARTH: [Action.MARTH_COUNTER, Action.MARTH_COUNTER_FALLING]})
+
+# Everything from LASER_GUN_PULL on is a B move. If we're missing it
+# (UNKNOWN_ANIMATION), don't call it a B move
+BMOVES = characterbits(actionbits(action for action in Action \
+        if Action.LASER_GUN_PULL.value <= action.value and action != Action.UNKNOWN_ANIMATION), {}, {
+    # Don't consider peach float to be a B move
+    #   But the rest of her float aerials ARE
+    # Peach smashes also shouldn't be B moves
+    Character.PEACH: [Action.LASER_GUN_PULL, Action.NEUTRAL_B_CHARGING, Action.NEUTRAL_B_ATTACKING,
+        Action.SWORD_DANCE_2_MID, Action.SWORD_DANCE_1, Action.SWORD_DANCE_2_HIGH]})
+
+SHIELDS = actionbits([Action.SHIELD, Action.SHIELD_START, Action.SHIELD_REFLECT, \
+    Action.SHIELD_STUN, Action.SHIELD_RELEASE])
+
+"""Everything about one character's action that's worked out from its frames,
+    so that it doesn't have to be worked out again on every call"""
+class ActionSummary:
+    __slots__ = ["isattack", "firsthitboxframe", "lasthitboxframe", "hitboxcount", "iasa",
+        "lastframe", "lastrollframe"]
+
+    """frames = Dict of action frame to frame dict, for the action
+        roll = Whether the action is a roll"""
+    def __init__(self, frames, roll):
+        # Grab only the subset that have a hitbox
+        hitboxes = [action_frame for action_frame, frame in frames.items() if frame and hashitbox(frame)]
+        self.isattack = bool(hitboxes)
+        self.firsthitboxframe = min(hitboxes) if hitboxes else -1
+        self.lasthitboxframe = max(hitboxes) if hitboxes else -1
+        hashitbox_old = False
+        self.hitboxcount = 0
+        # Every time we go from NOT having a hit box to having one, up the count
+        hitboxes = set(hitboxes)
+        for i in range(1, self.lasthitboxframe + 1):
+            hashitbox_new = i in hitboxes
+            if hashitbox_new and not hashitbox_old:
+                self.hitboxcount += 1
+            hashitbox_old = hashitbox_new
+        self.iasa = -1
+        if hitboxes:
+            allframes = [action_frame for action_frame, frame in frames.items() if frame]
+            iasaframes = [action_frame for action_frame, frame in frames.items() if frame and frame["iasa"]]
+            self.iasa = min(iasaframes) if iasaframes else max(allframes)
+        self.lastframe = max(frames) if frames else -1
+        self.lastrollframe = self.lastframe if roll else -1
+
+#The summary of an action with no frame data
+NO_FRAMES = ActionSummary({}, False)
+
+"""Frame data for every character's attacks, rolls and such, read in from
+    framedata.csv
+    write = Record new frame data from the opponent, with recordframe()
+    cache = Load framedata.csv from the compiled cache, building it first if
+        it's missing or the CSV has changed since"""
 class FrameData:
-    def __init__(self, write=False):
+    def __init__(self, write=False, cache=True):
         if write:
             self.csvfile = open('framedata.csv', 'a')
             fieldnames = ['character', 'action', 'frame',
@@ -30,39 +213,17 @@ class FrameData:
             self.prevprojectilecount = {}
 
         #Read the existing framedata
-        path = os.path.dirname(os.path.realpath(__file__))
         self.framedata = defaultdict(lambda: defaultdict(lambda: defaultdict(dict)))
-        with open(path + "/framedata.csv") as csvfile:
-            # A list of dicts containing the frame data
-            csvreader = list(csv.DictReader(csvfile))
-            # Build a series of nested dicts for faster read access
-            for frame in csvreader:
-                # Pull out the character, action, and frame
-                character = Character(int(frame["character"]))
-                action = Action(int(frame["action"]))
-                action_frame = int(frame["frame"])
-                self.framedata[character][action][action_frame] = \
-                    {"hitbox_1_status": frame["hitbox_1_status"] == "True", \
-                    "hitbox_1_size": float(frame["hitbox_1_size"]), \
-                    "hitbox_1_x": float(frame["hitbox_1_x"]), \
-                    "hitbox_1_y": float(frame["hitbox_1_y"]), \
-                    "hitbox_2_status": frame["hitbox_2_status"] == "True", \
-                    "hitbox_2_size": float(frame["hitbox_2_size"]), \
-                    "hitbox_2_x": float(frame["hitbox_2_x"]), \
-                    "hitbox_2_y": float(frame["hitbox_2_y"]), \
-                    "hitbox_3_status": frame["hitbox_3_status"] == "True", \
-                    "hitbox_3_size": float(frame["hitbox_3_size"]), \
-                    "hitbox_3_x": float(frame["hitbox_3_x"]), \
-                    "hitbox_3_y": float(frame["hitbox_3_y"]), \
-                    "hitbox_4_status": frame["hitbox_4_status"] == "True", \
-                    "hitbox_4_size": float(frame["hitbox_4_size"]), \
-                    "hitbox_4_x": float(frame["hitbox_4_x"]), \
-                    "hitbox_4_y": float(frame["hitbox_4_y"]), \
-                    "locomotion_x": float(frame["locomotion_x"]), \
-                    "locomotion_y": float(frame["locomotion_y"]), \
-                    "iasa": frame["iasa"] == "True", \
-                    "facing_changed": frame["facing_changed"] == "True", \
-                    "projectile": frame["projectile"] == "True"}
+        characters = {character.value: character for character in Character}
+        actions = {action.value: action for action in Action}
+        # Build a series of nested dicts for faster read access. The rows for
+        #   each action come together, so only look the action up once
+        current = None
+        for row in loadframes(cache):
+            if row[:2] != current:
+                current = row[:2]
+                frames = self.framedata[characters[row[0]]][actions[row[1]]]
+            frames[row[2]] = dict(zip(FRAME_FIELDS, row[3:]))
 
         #read the character data csv
         self.characterdata = dict()
@@ -76,83 +237,38 @@ class FrameData:
                     line[key] = float(value)
                 self.characterdata[Character(line["CharacterIndex"])] = line
 
-    #Returns boolean on if the given action is a roll
+        self.buildindex()
+
+    """Work out everything that gets asked about each character's actions up
+        front, so that asking is just a lookup"""
+    def buildindex(self):
+        #Dicts of character to a bitset of its actions in each category
+        self.grabs = GRABS
+        self.rolls = ROLLS
+        self.bmoves = BMOVES
+        #Dict of (character, action) to its ActionSummary
+        self.summaries = dict()
+        for character, actions in self.framedata.items():
+            for action, frames in actions.items():
+                self.summaries[(character, action)] = ActionSummary(frames, self.isroll(character, action))
+
+    #Returns boolean on if the given action is a grab
     def isgrab(self, character, action):
-        if action in [Action.GRAB, Action.GRAB_RUNNING]:
-            return True
-
-        # Yea, I know. The sword dance isn't the right name
-        if character in [Character.CPTFALCON, Character.GANONDORF] and \
-                action in [Action.SWORD_DANCE_3_MID, Action.SWORD_DANCE_3_LOW]:
-            return True
-
-        if character == Character.BOWSER and \
-                action in [Action.NEUTRAL_B_ATTACKING_AIR, Action.SWORD_DANCE_3_MID]:
-            return True
-
-        if character == Character.YOSHI and \
-                action in [Action.NEUTRAL_B_CHARGING_AIR, Action.SWORD_DANCE_2_MID]:
-            return True
-
-        return False
+        return bool(self.grabs.get(character, 0) >> action.value & 1)
 
     #Returns boolean on if the given action is a roll
     def isroll(self, character, action):
-        # Marth counter
-        if character == Character.MARTH and action == Action.MARTH_COUNTER:
-            return True
-        if character == Character.MARTH and action == Action.MARTH_COUNTER_FALLING:
-            return True
-
-        # Turns out that the actions we'd call a "roll" are fairly few. Let's just
-        # hardcode them since it's just more cumbersome to do otherwise
-        rolls = [Action.SPOTDODGE, Action.ROLL_FORWARD, Action.ROLL_BACKWARD, \
-            Action.NEUTRAL_TECH, Action.FORWARD_TECH, Action.BACKWARD_TECH, \
-            Action.GROUND_GETUP, Action.TECH_MISS_UP, Action.TECH_MISS_DOWN, \
-            Action.EDGE_GETUP_SLOW, Action.EDGE_GETUP_QUICK, Action.EDGE_ROLL_SLOW, \
-            Action.EDGE_ROLL_QUICK, Action.GROUND_ROLL_FORWARD_UP, Action.GROUND_ROLL_BACKWARD_UP, \
-            Action.GROUND_ROLL_FORWARD_DOWN, Action.GROUND_ROLL_BACKWARD_DOWN, Action.SHIELD_BREAK_FLY, \
-            Action.SHIELD_BREAK_FALL, Action.SHIELD_BREAK_DOWN_U, Action.SHIELD_BREAK_DOWN_D, \
-            Action.SHIELD_BREAK_STAND_U, Action.SHIELD_BREAK_STAND_D, Action.TAUNT_RIGHT, Action.TAUNT_LEFT, Action.SHIELD_BREAK_TEETER]
-        return action in rolls
+        return bool(self.rolls.get(character, 0) >> action.value & 1)
 
     def isbmove(self, character, action):
-        # If we're missing it, don't call it a B move
-        if action == Action.UNKNOWN_ANIMATION:
-            return False
-
-        # Don't consider peach float to be a B move
-        #   But the rest of her float aerials ARE
-        if character == Character.PEACH and action in [Action.LASER_GUN_PULL, \
-                Action.NEUTRAL_B_CHARGING, Action.NEUTRAL_B_ATTACKING]:
-            return False
-        # Peach smashes also shouldn't be B moves
-        if character == Character.PEACH and action in [Action.SWORD_DANCE_2_MID, Action.SWORD_DANCE_1, \
-                Action.SWORD_DANCE_2_HIGH]:
-            return False
-
-        if Action.LASER_GUN_PULL.value <= action.value:
-            return True
-
-        return False
+        return bool(self.bmoves.get(character, 0) >> action.value & 1)
 
     #Returns boolean on if the given action is an attack (contains a hitbox)
     def isattack(self, character, action):
-        # For each frame...
-        for i, frame in self.framedata[character][action].items():
-            if frame:
-                if frame['hitbox_1_status'] or frame['hitbox_2_status'] or frame['hitbox_3_status'] or \
-                        frame['hitbox_4_status'] or frame['projectile']:
-                    return True
-        return False
+        return self.summaries.get((character, action), NO_FRAMES).isattack
 
     def isshield(self, action):
-        out = action == Action.SHIELD \
-            or action == Action.SHIELD_START \
-            or action == Action.SHIELD_REFLECT \
-            or action == Action.SHIELD_STUN \
-            or action == Action.SHIELD_RELEASE
-        return out
+        return bool(SHIELDS >> action.value & 1)
 
     def maxjumps(character):
         if character == Character.JIGGLYPUFF:
@@ -170,13 +286,14 @@ class FrameData:
         return self.attackstate(player.character, player.action, player.action_frame)
 
     def attackstate(self, character, action, frame):
-        if not self.isattack(character, action):
+        summary = self.summaries.get((character, action), NO_FRAMES)
+        if not summary.isattack:
             return AttackState.NOT_ATTACKING
 
-        if frame < self.firsthitboxframe(character, action):
+        if frame < summary.firsthitboxframe:
             return AttackState.WINDUP
 
-        if frame > self.lasthitboxframe(character, action):
+        if frame > summary.lasthitboxframe:
             return AttackState.COOLDOWN
 
         return AttackState.ATTACKING
@@ -421,14 +538,7 @@ class FrameData:
     # Returns the last frame of the roll
     # -1 if not a roll
     def lastrollframe(self, character, action):
-        if not self.isroll(character, action):
-            return -1
-        frames = []
-        for action_frame in self.framedata[character][action]:
-            frames.append(action_frame)
-        if not frames:
-            return -1
-        return max(frames)
+        return self.summaries.get((character, action), NO_FRAMES).lastrollframe
 
     # Returns the x coordinate that the current roll will end in
     def endrollposition(self, character_state, stage):
@@ -465,93 +575,33 @@ class FrameData:
     #Returns the first frame that a hitbox appears for a given action
     #   returns -1 if no hitboxes (not an attack action)
     def firsthitboxframe(self, character, action):
-        # Grab only the subset that have a hitbox
-        hitboxes = []
-        for action_frame, frame in self.framedata[character][action].items():
-            if frame:
-                #Does this frame have a hitbox?
-                if frame['hitbox_1_status'] or frame['hitbox_2_status'] \
-                    or frame['hitbox_3_status'] or frame['hitbox_4_status'] or \
-                        frame['projectile']:
-                    hitboxes.append(action_frame)
-        if not hitboxes:
-            return -1
-        return min(hitboxes)
+        return self.summaries.get((character, action), NO_FRAMES).firsthitboxframe
 
     # Returns the number of hitboxes an attack has
     #   By this we mean is it a multihit attack? (Peach's down B?)
     #       or a single-hit attack? (Marth's fsmash?)
     def hitboxcount(self, character, action):
-        # Grab only the subset that have a hitbox
-
         # This math doesn't work for Samu's UP_B
         #   Because the hitboxes are contiguous
         if character == Character.SAMUS and action in [Action.SWORD_DANCE_3_MID, Action.SWORD_DANCE_3_LOW]:
             return 7
-
-        hitboxes = []
-        for action_frame, frame in self.framedata[character][action].items():
-            if frame:
-                #Does this frame have a hitbox?
-                if frame['hitbox_1_status'] or frame['hitbox_2_status'] \
-                    or frame['hitbox_3_status'] or frame['hitbox_4_status'] or \
-                        frame['projectile']:
-                    hitboxes.append(action_frame)
-        if not hitboxes:
-            return 0
-        hashitbox = False
-        count = 0
-        # Every time we go from NOT having a hit box to having one, up the count
-        for i in range(1, max(hitboxes)+1):
-            hashitbox_new = i in hitboxes
-            if hashitbox_new and not hashitbox:
-                count += 1
-            hashitbox = hashitbox_new
-        return count
+        return self.summaries.get((character, action), NO_FRAMES).hitboxcount
 
     # Returns the first frame of an attack that the character is interruptible
     #   returns -1 if not an attack
     def iasa(self, character, action):
-        if not self.isattack(character, action):
-            return -1
-        iasaframes = []
-        allframes = []
-        for action_frame, frame in self.framedata[character][action].items():
-            if frame:
-                #Does this frame have a hitbox?
-                allframes.append(action_frame)
-                if frame["iasa"]:
-                    iasaframes.append(action_frame)
-        if not iasaframes:
-            return max(allframes)
-        return min(iasaframes)
+        return self.summaries.get((character, action), NO_FRAMES).iasa
 
     #Returns the last frame that a hitbox appears for a given action
     #   returns -1 if no hitboxes (not an attack action)
     def lasthitboxframe(self, character, action):
-        # Grab only the subset that have a hitbox
-        hitboxes = []
-        for action_frame, frame in self.framedata[character][action].items():
-            if frame:
-                #Does this frame have a hitbox?
-                if frame['hitbox_1_status'] or frame['hitbox_2_status'] \
-                    or frame['hitbox_3_status'] or frame['hitbox_4_status'] or \
-                        frame['projectile']:
-                    hitboxes.append(action_frame)
-        if not hitboxes:
-            return -1
-        return max(hitboxes)
+        return self.summaries.get((character, action), NO_FRAMES).lasthitboxframe
 
     """
     Returns the count of total frames in the given action.
     """
     def lastframe(self, character, action):
-        frames = []
-        for action_frame, frame in self.framedata[character][action].items():
-            frames.append(action_frame)
-        if not frames:
-            return -1
-        return max(frames)
+        return self.summaries.get((character, action), NO_FRAMES).lastframe
 
     #This is a helper function to remove all the non-attacking, non-rolling, non-B move actions
     def cleanupcsv(self):
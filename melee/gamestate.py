@@ -1,49 +1,84 @@
-from melee import enums, stages
-from melee.enums import Action, Character
+from melee import enums, stages, decoder
+from melee.enums import Action, Character, ControllerStatus
+import asyncio
+import binascii
+import copy
 import csv
 from struct import *
-import binascii
 import os
 import socket
 import math
+import threading
 import time
 from collections import defaultdict
+from operator import attrgetter
+from types import MappingProxyType
+
+#The attributes of a GameState that describe the game itself, as opposed to
+#   the socket and decoder. Players and projectiles are handled on their own
+FRAMEATTRIBUTES = ["frame", "stage", "menu_state", "stage_select_cursor_x",
+    "stage_select_cursor_y", "ready_to_start", "distance", "droppedframes",
+    "duplicateframes", "ackedframes"]
+
+#Where a projectile's speed and position sit in its block of memory, x_speed
+#   and y_speed, then x and y
+PROJECTILE_MOTION = Struct('>ff4xff')
+PROJECTILE_SUBTYPE = Struct('>I')
+
+#How long Melee spends on each frame, in seconds
+FRAMETIME = 1 / 60
 
-"""Represents the state of a running game of Melee at a given moment in time"""
+"""Represents the state of a running game of Melee at a given moment in time
+    Everything lives on the instance, so several games can run in one process"""
 class GameState:
-    frame = 0
-    stage = enums.Stage.FINAL_DESTINATION
-    menu_state = enums.Menu.CHARACTER_SELECT
-    player = dict()
-    projectiles = []
-    stage_select_cursor_x = 0.0
-    stage_select_cursor_y = 0.0
-    ready_to_start = False
-    distance = 0.0
-    sock = None
-    processingtime = 0.0
-    frametimestamp = 0.0
-
-    def __init__(self, dolphin):
-        #Dict with key of address, and value of (name, player)
-        self.locations = dict()
+    __slots__ = ["frame", "stage", "menu_state", "player", "projectiles",
+        "stage_select_cursor_x", "stage_select_cursor_y", "ready_to_start",
+        "distance", "sock", "processingtime", "frametimestamp", "datagrams",
+        "droppedframes", "duplicateframes", "lateframes", "lastframe", "ongap",
+        "snapshots", "snapshot", "sparesnapshot", "drain", "threaded", "skippedframes", "fields",
+        "rawfields", "ai_state", "opponent_state", "ai_states", "newframe", "i", "characterdata",
+        "zero_indices", "back", "ready", "published", "publishedframes",
+        "consumedframes", "receiver", "receivererror", "steady", "projectilepool", "recorder",
+        "lockstep", "ackedframes", "latency"]
+
+    """drain = Pull all the queued up memory updates off the socket in one tight
+        loop, rather than returning to the iterator for each one
+    lazy = Hold on to the raw memory updates for most player fields, and only
+        decode them when they're actually read
+    threaded = Receive and decode memory updates on a background thread. Each
+        step() then jumps straight to the newest finished frame, skipping over
+        any that came in while the bot was busy
+    snapshots = At the end of each frame, publish a read-only copy of it as
+        self.snapshot. Other threads can read that without any locking. In
+        steady mode, two snapshots get filled in turn about, so don't hang on
+        to one for longer than a frame
+    ongap = Function called as ongap(gamestate, gap) whenever the frame counter
+        doesn't go up by exactly one. A gap of 0 is a duplicate frame, and more
+        than 1 means frames were dropped. In threaded mode this gets called on
+        the receiver thread, with the back buffer
+    steady = Reuse objects from frame to frame rather than making new ones, so
+        that a game in progress doesn't keep the garbage collector busy.
+        Projectiles are reused, so don't hang on to them past the frame
+    recorder = A melee.recorder.Recorder to write every memory update to, as
+        it comes in
+    latency = A melee.latency.LatencyTracker to match the bot's inputs up to
+        the action changes they lead to, at the end of each frame"""
+    def __init__(self, dolphin, drain=False, lazy=False, threaded=False, snapshots=False,
+            ongap=None, steady=False, recorder=None, latency=None):
+        self.setdefaults()
+        self.steady = steady
+        self.recorder = recorder
+        self.latency = latency
+        self.lockstep = dolphin.lockstep
+        self.drain = drain
+        self.snapshots = snapshots
+        self.ongap = ongap
+        self.threaded = threaded
         path = os.path.dirname(os.path.realpath(__file__))
-        with open(path + "/locations.csv") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for line in reader:
-                self.locations[line["Address"]] = (line["Name"], line["Player"])
-        self.player[1] = PlayerState()
-        self.player[2] = PlayerState()
-        self.player[3] = PlayerState()
-        self.player[4] = PlayerState()
-        self.player[5] = PlayerState()
-        self.player[6] = PlayerState()
-        self.player[7] = PlayerState()
-        self.player[8] = PlayerState()
-        self.newframe = True
-        #Helper names to keep track of us and our opponent
-        self.ai_state = self.player[dolphin.ai_port]
-        self.opponent_state = self.player[dolphin.opponent_port]
+        self.setupfields(dolphin, lazy)
+        #Give every address we decode its id at the top of the log
+        if recorder is not None:
+            recorder.define(self.rawfields)
         #Read in the action data csv
         with open(path + "/actiondata.csv") as csvfile:
             #A list of dicts containing the frame data
@@ -72,6 +107,156 @@ class GameState:
             pass
         self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
         self.sock.bind(path)
+        if threaded:
+            #The receiver thread decodes into the back buffer. Finished frames
+            #   are copied into the ready buffer, then from there over to us
+            self.back = self.makebuffer(dolphin, lazy)
+            self.back.snapshots = snapshots
+            self.back.ongap = ongap
+            self.back.steady = steady
+            self.back.recorder = recorder
+            self.back.latency = latency
+            if latency is not None:
+                latency.threaded = True
+            self.back.lockstep = self.lockstep
+            self.ready = self.makebuffer(dolphin, lazy)
+            self.published = threading.Condition()
+            self.publishedframes = 0
+            self.consumedframes = 0
+            self.receiver = threading.Thread(target=self.receive, daemon=True)
+            self.receiver.start()
+
+    """Start off with everything at its default, before the first frame"""
+    def setdefaults(self):
+        self.frame = 0
+        self.stage = enums.Stage.FINAL_DESTINATION
+        self.menu_state = enums.Menu.CHARACTER_SELECT
+        self.player = dict()
+        self.projectiles = []
+        self.stage_select_cursor_x = 0.0
+        self.stage_select_cursor_y = 0.0
+        self.ready_to_start = False
+        self.distance = 0.0
+        self.sock = None
+        self.processingtime = 0.0
+        self.frametimestamp = 0.0
+        self.datagrams = 0
+        #Frame counter values that never showed up, since we started
+        self.droppedframes = 0
+        #Frames that showed up more than once
+        self.duplicateframes = 0
+        #Frames that the bot took longer than FRAMETIME to get back to us from
+        self.lateframes = 0
+        #Whether dolphin waits for the bot's inputs at the end of each frame
+        self.lockstep = False
+        #Frames that dolphin moved on from once it had the bot's inputs, in lockstep
+        self.ackedframes = 0
+        self.lastframe = None
+        self.ongap = None
+        self.snapshots = False
+        self.snapshot = None
+        #The snapshot before the current one, to fill in next, in steady mode
+        self.sparesnapshot = None
+        self.drain = False
+        self.threaded = False
+        #How many frames the last step() skipped over, in threaded mode
+        self.skippedframes = 0
+        self.i = 0
+        self.steady = False
+        #Projectiles that get reused from frame to frame, in steady mode
+        self.projectilepool = []
+        #The thread decoding into the back buffer, in threaded mode
+        self.receiver = None
+        #What stopped the receiver thread, if it died. step() raises it
+        self.receivererror = None
+        self.recorder = None
+        self.latency = None
+
+    """Build the dispatch table, and the players that it decodes into"""
+    def setupfields(self, dolphin, lazy):
+        #Dict with key of address, and value of the Field that decodes it
+        self.fields = decoder.compilelocations(dolphin.fields)
+        #Read nearby fields together, if dolphin is set up to do that
+        if dolphin.blockread:
+            self.fields = decoder.compileblocks(self.fields)
+        #The same, keyed by the raw bytes that dolphin sends
+        self.rawfields = {address.encode(): field for address, field in self.fields.items()}
+        playertype = PlayerState
+        if lazy:
+            playertype = LazyPlayerState
+        for i in range(1, 9):
+            self.player[i] = playertype()
+        self.newframe = True
+        #Point each field at the object its value gets stored on
+        for field in decoder.allfields(self.fields):
+            if field.player:
+                field.target = self.player[field.player]
+            else:
+                field.target = self
+            # Plain stores can wait until someone actually reads the value
+            if lazy and field.player and field.handler is None and field.previous is None:
+                field.target.lazyfields[field.attribute] = field
+                field.pending = field.target.pending
+        #Helper names to keep track of us and our opponent
+        self.ai_state = self.player[dolphin.ai_port]
+        self.opponent_state = self.player[dolphin.opponent_port]
+        #Dict of port to PlayerState, for every port that a bot plays on
+        self.ai_states = {port: self.player[port] for port in dolphin.ai_ports}
+
+    """Make another GameState to decode into, with its own players, but the
+        same lookup tables as this one"""
+    def makebuffer(self, dolphin, lazy):
+        buffer = GameState.__new__(GameState)
+        buffer.setdefaults()
+        buffer.characterdata = self.characterdata
+        buffer.zero_indices = self.zero_indices
+        buffer.setupfields(dolphin, lazy)
+        return buffer
+
+    """Copy the state of the game (but not the socket or decoder) over from
+        another GameState"""
+    def copyframe(self, other):
+        for name in FRAMEATTRIBUTES:
+            setattr(self, name, getattr(other, name))
+        self.projectiles = other.copyprojectiles()
+        for i, player in self.player.items():
+            player.copyfrom(other.player[i])
+
+    """Decode memory updates as they come in, forever. Runs on the receiver
+        thread, into the back buffer. Each finished frame gets copied over to
+        be picked up by step()"""
+    def receive(self):
+        back = self.back
+        datagrams = 0
+        while True:
+            try:
+                data = self.sock.recv(9096)
+            except socket.timeout:
+                continue
+            except OSError:
+                #The socket got closed out from under us
+                return
+            if not data:
+                #Shut down by close()
+                return
+            datagrams += 1
+            try:
+                finished = back.updatedatagram(data)
+            except Exception as error:
+                #Hand it over to step() to raise, rather than leave it waiting
+                #   on a frame that will never come
+                with self.published:
+                    self.receivererror = error
+                    self.published.notify()
+                return
+            if finished:
+                self.snapshot = back.snapshot
+                with self.published:
+                    self.ready.copyframe(back)
+                    self.ready.datagrams = datagrams
+                    self.publishedframes += 1
+                    self.published.notify()
+                datagrams = 0
 
     """Return a list representation of the current gamestate
     Only caring about in-game things, not menus and such"""
@@ -88,25 +273,123 @@ class GameState:
         return thelist
 
     def step(self):
-        # How long did it take to get here from last time?
-        self.processingtime = time.time() - self.frametimestamp
+        self.timeprocessing()
+        if self.threaded:
+            self.stepthreaded()
+            # Start the timer, now that we're done waiting for dolphin updates
+            self.frametimestamp = time.time()
+            return
+        if self.drain:
+            self.datagrams = self.drainframe()
+            # Start the timer, now that we're done waiting for dolphin updates
+            self.frametimestamp = time.time()
+            return
+        self.datagrams = 0
         for mem_update in self:
+            self.datagrams += 1
             #If the frame counter has updated, then process it!
             if self.update(mem_update):
                 # Start the timer, now that we're done waiting for dolphin updates
                 self.frametimestamp = time.time()
                 return
+
+    """How long did it take to get here from last time?"""
+    def timeprocessing(self):
+        self.processingtime = time.time() - self.frametimestamp
+        # The very first frame doesn't count, there's nothing to be late for
+        #   And in lockstep, dolphin waits for us, so nothing is ever late
+        if self.frametimestamp and self.processingtime > FRAMETIME and not self.lockstep:
+            self.lateframes += 1
+
+    """The same as step(), but waits for dolphin on an asyncio event loop
+        rather than blocking. This lets one loop drive several games at once,
+        along with whatever else the bot is waiting on
+        Puts the socket into non-blocking mode, so don't mix this with step()
+        Not for use in threaded mode"""
+    async def step_async(self):
+        self.timeprocessing()
+        loop = asyncio.get_running_loop()
+        self.sock.setblocking(False)
+        recv = self.sock.recv
+        update = self.updatedatagram
+        self.datagrams = 0
+        while True:
+            data = await loop.sock_recv(self.sock, 9096)
+            self.datagrams += 1
+            done = update(data)
+            # Take everything else that's already waiting, without going back
+            #   to the event loop for each one
+            while not done:
+                try:
+                    data = recv(9096)
+                except BlockingIOError:
+                    break
+                self.datagrams += 1
+                done = update(data)
+            if done:
+                # Start the timer, now that we're done waiting for dolphin updates
+                self.frametimestamp = time.time()
+                return
+
+    """Step through frames as they arrive, on an asyncio event loop
+        Use it like: async for gamestate in gamestate.frames():"""
+    async def frames(self):
+        while True:
+            await self.step_async()
+            yield self
+
+    """Wait for the receiver thread to finish a frame we haven't seen yet, then
+        jump to the newest one it has"""
+    def stepthreaded(self):
+        with self.published:
+            while self.publishedframes == self.consumedframes:
+                if self.receivererror is not None:
+                    raise self.receivererror
+                self.published.wait()
+            self.skippedframes = self.publishedframes - self.consumedframes - 1
+            self.consumedframes = self.publishedframes
+            self.copyframe(self.ready)
+            self.datagrams = self.ready.datagrams
+        if self.latency is not None:
+            self.latency.consumed(self.frame)
+
+    """Process every memory update waiting on the socket, until the frame is done
+        Only the first read of a frame blocks. After that, we keep reading
+        without blocking for as long as dolphin has updates queued up.
+        Returns the number of updates processed"""
+    def drainframe(self):
+        recv = self.sock.recv
+        update = self.updatedatagram
+        count = 0
+        flags = 0
+        while True:
+            try:
+                data = recv(9096, flags)
+            except BlockingIOError:
+                # We've caught up with dolphin, but the frame isn't done yet
+                flags = 0
+                continue
+            except socket.timeout:
+                return count
+            # The frame has begun, so don't block until we run out of updates
+            flags = socket.MSG_DONTWAIT
+            count += 1
+            if update(data):
+                return count
+
     #Melee's indexing of action frames is wildly inconsistent.
     #   Here we adjust all of the frames to be indexed at 1 (so math is easier)
-    def fixframeindexing(self):
-        for index, player in self.player.items():
+    #   players = List of (port, PlayerState) to fix
+    def fixframeindexing(self, players):
+        for index, player in players:
             if player.action.value in self.zero_indices[player.character.value]:
                 player.action_frame = player.action_frame + 1
 
     # The IASA flag doesn't set or reset for special attacks.
     #   So let's just set IASA to False for all non-A attacks.
-    def fixiasa(self):
-        for index, player in self.player.items():
+    #   players = List of (port, PlayerState) to fix
+    def fixiasa(self, players):
+        for index, player in players:
             # Luckily for us, all the A-attacks are in a contiguous place in the enums!
             #   So we don't need to call them out one by one
             if player.action.value < Action.NEUTRAL_ATTACK_1.value or player.action.value > Action.DAIR.value:
@@ -117,342 +400,258 @@ class GameState:
        Run this in a loop until it returns returns True, then press your buttons,
        wash, rinse, repeat."""
     def update(self, mem_update):
-        label = self.locations[mem_update[0]][0]
-        player_int = int(self.locations[mem_update[0]][1])
-        if label == "frame":
-            self.frame = unpack('<I', mem_update[1])[0]
-            self.newframe = True
-            #Now that the frame is ready, let's calculate some derived information
-            #   These are not stored inside Melee anywhere, but are nonetheless
-            #   important pieces of information that we don't want to make the
-            #   user have to re-calculate on their own
-            for i in self.player:
-                # Move current x,y over to prev
-                self.player[i].prev_x = self.player[i].x
-                self.player[i].prev_y = self.player[i].y
-                # Move future x,y over to current
-                self.player[i].x = self.player[i].next_x
-                self.player[i].y = self.player[i].next_y
-
-                if (abs(self.player[i].x) > stages.edgegroundposition(self.stage) or \
-                        self.player[i].y < -6) and not self.player[i].on_ground:
-                    self.player[i].off_stage = True
-                else:
-                    self.player[i].off_stage = False
-
-                # Keep track of a player's invulnerability due to respawn or ledge grab
-                self.player[i].invulnerability_left = max(0, self.player[i].invulnerability_left - 1)
-                if self.player[i].action == Action.ON_HALO_WAIT:
-                    self.player[i].invulnerability_left = 120
-                # Don't give invulnerability to the first descent
-                if self.player[i].action == Action.ON_HALO_DESCENT and self.frame > 150:
-                    self.player[i].invulnerability_left = 120
-                if self.player[i].action == Action.EDGE_CATCHING and self.player[i].action_frame == 1:
-                    self.player[i].invulnerability_left = 36
-
-                # Which character are we right now?
-                if self.player[i].character in [Character.SHEIK, Character.ZELDA]:
-                    if self.player[i].transformed == self.player[i].iszelda:
-                        self.player[i].character = Character.SHEIK
-                    else:
-                        self.player[i].character = Character.ZELDA
-                # If the player is transformed, then copy over the sub-character attributes
-                if self.player[i].transformed:
-                    self.player[i].action = self.player[i+4].action
-                    self.player[i].action_counter = self.player[i+4].action_counter
-                    self.player[i].action_frame = self.player[i+4].action_frame
-                    self.player[i].invulnerable = self.player[i+4].invulnerable
-                    self.player[i].hitlag_frames_left = self.player[i+4].hitlag_frames_left
-                    self.player[i].hitstun_frames_left = self.player[i+4].hitstun_frames_left
-                    self.player[i].charging_smash = self.player[i+4].charging_smash
-                    self.player[i].jumps_left = self.player[i+4].jumps_left
-                    self.player[i].on_ground = self.player[i+4].on_ground
-                    self.player[i].speed_air_x_self = self.player[i+4].speed_air_x_self
-                    self.player[i].speed_y_self = self.player[i+4].speed_y_self
-                    self.player[i].speed_x_attack = self.player[i+4].speed_x_attack
-                    self.player[i].speed_y_attack = self.player[i+4].speed_y_attack
-                    self.player[i].speed_ground_x_self = self.player[i+4].speed_ground_x_self
-                    self.player[i].x = self.player[i+4].x
-                    self.player[i].y = self.player[i+4].y
-                    self.player[i].percent = self.player[i+4].percent
-                    self.player[i].facing = self.player[i+4].facing
-
-                # The pre-warning occurs when we first start a dash dance.
-                if self.player[i].action == Action.DASHING and self.player[i].prev_action not in [Action.DASHING, Action.TURNING]:
-                    self.player[i].moonwalkwarning = True
-
-                # Take off the warning if the player does an action other than dashing
-                if self.player[i].action != Action.DASHING:
-                    self.player[i].moonwalkwarning = False
-
-            #TODO: This needs updating in order to support >2 players
-            xdist = self.ai_state.x - self.opponent_state.x
-            ydist = self.ai_state.y - self.opponent_state.y
-            self.distance = math.sqrt( (xdist**2) + (ydist**2) )
-            self.fixiasa()
-            self.fixframeindexing()
-            return True
-        if label == "stage":
-            self.stage = unpack('<I', mem_update[1])[0]
-            self.stage = self.stage >> 16
-            self.stage &= 0x000000ff
-            try:
-                self.stage = enums.Stage(self.stage)
-            except ValueError:
-                self.stage = enums.Stage.NO_STAGE
-            return False
-        if label == "menu_state":
-            self.menu_state = unpack('<I', mem_update[1])[0]
-            self.menu_state &= 0x000000ff
-            self.menu_state = enums.Menu(self.menu_state)
-            return False
-        #Player variables
-        if label == "percent":
-            if player_int > 4:
-                try:
-                    self.player[player_int].percent = int(unpack('<f', mem_update[1])[0])
-                except ValueError:
-                    self.player[player_int].percent = 0
-                return False
-            self.player[player_int].percent = unpack('<I', mem_update[1])[0]
-            self.player[player_int].percent = self.player[player_int].percent >> 16
-            return False
-        if label == "stock":
-            self.player[player_int].stock = unpack('<I', mem_update[1])[0]
-            self.player[player_int].stock = self.player[player_int].stock >> 24
-            return False
-        if label == "facing":
-            self.player[player_int].facing = unpack('<I', mem_update[1])[0]
-            self.player[player_int].facing = not bool(self.player[player_int].facing >> 31)
-            return False
-        if label == "x":
-            self.player[player_int].next_x = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "y":
-            self.player[player_int].next_y = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "character":
-            temp = unpack('<I', mem_update[1])[0] >> 24
-            try:
-                self.player[player_int].character = enums.Character(temp)
-            except ValueError:
-                self.player[player_int].character = enums.Character.UNKNOWN_CHARACTER
-            return False
-        if label == "cursor_x":
-            self.player[player_int].cursor_x = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "cursor_y":
-            self.player[player_int].cursor_y = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "action":
-            temp = unpack('<I', mem_update[1])[0]
-            try:
-                # Keep track of old action
-                self.player[player_int].prev_action = self.player[player_int].action
-                self.player[player_int].action = enums.Action(temp)
-            except ValueError:
-                self.player[player_int].action = enums.Action.UNKNOWN_ANIMATION
-            return False
-        if label == "action_counter":
-            #TODO look if this is backwards
-            temp = unpack('I', mem_update[1])[0]
-            temp = temp >> 8
-            self.player[player_int].action_counter = temp
+        if self.recorder is not None:
+            self.recorder.record(mem_update[0].encode(), binascii.hexlify(mem_update[1]))
+        field = self.fields.get(mem_update[0])
+        if field is None:
             return False
-        if label == "action_frame":
-            temp = unpack('<f', mem_update[1])[0]
-            try:
-                self.player[player_int].action_frame = int(temp)
-            except ValueError:
-                pass
-            return False
-        if label == "invulnerable":
-            self.player[player_int].invulnerable = unpack('<I', mem_update[1])[0]
-            self.player[player_int].invulnerable = self.player[player_int].invulnerable >> 31
-            return False
-        if label == "hitlag_frames_left":
-            temp = unpack('<f', mem_update[1])[0]
-            try:
-                self.player[player_int].hitlag_frames_left = int(temp)
-            except ValueError:
-                pass
+        # In lazy mode, most fields only need stashing away. Do that right
+        #   here, since it's cheaper than the call to updatefield()
+        if field.pending is not None:
+            field.pending[field.attribute] = mem_update[1]
             return False
-        if label == "hitstun_frames_left":
-            temp = unpack('<f', mem_update[1])[0]
-            try:
-                self.player[player_int].hitstun_frames_left = int(temp)
-            except ValueError:
-                pass
+        return self.updatefield(field, mem_update[1])
+
+    """Process one raw datagram from dolphin
+        This works on the bytes directly, without decoding them into strings
+        first. Returns True if the frame is finished"""
+    def updatedatagram(self, data):
+        address, _, value = data.partition(b'\n')
+        if self.recorder is not None:
+            self.recorder.record(address, value)
+        field = self.rawfields.get(address)
+        if field is None:
             return False
-        if label == "charging_smash":
-            temp = unpack('<I', mem_update[1])[0]
-            if temp == 2:
-                self.player[player_int].charging_smash = True
-            else:
-                self.player[player_int].charging_smash = False
+        # Strip the null terminator, pad with zeros, then convert to bytes
+        payload = binascii.unhexlify(value.rstrip(b'\x00').zfill(8))
+        if field.pending is not None:
+            field.pending[field.attribute] = payload
             return False
-        if label == "jumps_left":
-            temp = unpack('<I', mem_update[1])[0]
-            temp = temp >> 24
-            #This value is actually the number of jumps USED
-            #   so we have to do some quick math to turn this into what we want
+        return self.updatefield(field, payload)
+
+    """Decode a payload with the given field, and store it away"""
+    def updatefield(self, field, payload):
+        # In lazy mode, hang on to the payload until the value is read
+        if field.pending is not None:
+            field.pending[field.attribute] = payload
+            return False
+        if field.handler is not None:
+            return getattr(self, field.handler)(field, payload)
+        value = field.unpack(payload, field.offset)[0]
+        if field.shift:
+            value >>= field.shift
+        if field.mask:
+            value &= field.mask
+        if field.convert is not None:
             try:
-                totaljumps = int(self.characterdata[self.player[player_int].character]["Jumps"])
-                self.player[player_int].jumps_left = totaljumps - temp + 1
-            # Key error will be expected when we first start
-            except KeyError:
-                self.player[player_int].jumps_left = 1
-            return False
-        if label == "on_ground":
-            temp = unpack('<I', mem_update[1])[0]
-            if temp == 0:
-                self.player[player_int].on_ground = True
+                value = field.convert(value)
+            except (ValueError, OverflowError):
+                return False
+        if field.previous is not None:
+            setattr(field.target, field.previous, getattr(field.target, field.attribute))
+        setattr(field.target, field.attribute, value)
+        return False
+
+    """The frame counter has updated, so the frame is finished"""
+    def updateframe(self, field, payload):
+        self.frame = field.decode(payload)
+        if self.lastframe is not None and self.frame != self.lastframe + 1:
+            self.countgap(self.frame - self.lastframe)
+        elif self.lockstep and self.lastframe is not None:
+            #Dolphin only moves on once it has our inputs for the last frame
+            self.ackedframes += 1
+        self.lastframe = self.frame
+        self.newframe = True
+        #Now that the frame is ready, let's calculate some derived information
+        #   These are not stored inside Melee anywhere, but are nonetheless
+        #   important pieces of information that we don't want to make the
+        #   user have to re-calculate on their own
+        #Ports with nobody plugged in have nothing worth working out, and in
+        #   lazy mode this way their fields never get decoded
+        players = self.activeplayers()
+        for i, player in players:
+            # Move current x,y over to prev
+            self.player[i].prev_x = self.player[i].x
+            self.player[i].prev_y = self.player[i].y
+            # Move future x,y over to current
+            self.player[i].x = self.player[i].next_x
+            self.player[i].y = self.player[i].next_y
+
+            if (abs(self.player[i].x) > stages.edgegroundposition(self.stage) or \
+                    self.player[i].y < -6) and not self.player[i].on_ground:
+                self.player[i].off_stage = True
             else:
-                self.player[player_int].on_ground = False
-            return False
-        if label == "speed_air_x_self":
-            self.player[player_int].speed_air_x_self = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "speed_y_self":
-            self.player[player_int].speed_y_self = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "speed_x_attack":
-            self.player[player_int].speed_x_attack = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "speed_y_attack":
-            self.player[player_int].speed_y_attack = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "speed_ground_x_self":
-            self.player[player_int].speed_ground_x_self = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "coin_down":
-            temp = unpack('<I', mem_update[1])[0]
-            temp = temp & 0x000000ff
-            self.player[player_int].coin_down = (temp == 2)
-            return False
-        if label == "stage_select_cursor_x":
-            self.stage_select_cursor_x = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "stage_select_cursor_y":
-            self.stage_select_cursor_y = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "ready_to_start":
-            temp = unpack('>I', mem_update[1])[0]
-            temp = temp & 0x000000ff
-            self.ready_to_start = not bool(temp)
-            return False
-        if label == "controller_status":
-            temp = unpack('>I', mem_update[1])[0]
-            temp = temp & 0x000000ff
-            self.player[player_int].controller_status = enums.ControllerStatus(temp)
-            return False
-        if label == "hitbox_1_size":
-            self.player[player_int].hitbox_1_size = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "hitbox_2_size":
-            self.player[player_int].hitbox_2_size = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "hitbox_3_size":
-            self.player[player_int].hitbox_3_size = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "hitbox_4_size":
-            self.player[player_int].hitbox_4_size = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "hitbox_1_status":
-            temp = unpack('<I', mem_update[1])[0]
-            status = True
-            if temp == 0:
-                status = False
-            self.player[player_int].hitbox_1_status = status
-            return False
-        if label == "hitbox_2_status":
-            temp = unpack('<I', mem_update[1])[0]
-            status = True
-            if temp == 0:
-                status = False
-            self.player[player_int].hitbox_2_status = status
-            return False
-        if label == "hitbox_3_status":
-            temp = unpack('<I', mem_update[1])[0]
-            status = True
-            if temp == 0:
-                status = False
-            self.player[player_int].hitbox_3_status = status
-            return False
-        if label == "hitbox_4_status":
-            temp = unpack('<I', mem_update[1])[0]
-            status = True
-            if temp == 0:
-                status = False
-            self.player[player_int].hitbox_4_status = status
-            return False
-        if label == "hitbox_1_x":
-            self.player[player_int].hitbox_1_x = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "hitbox_1_y":
-            self.player[player_int].hitbox_1_y = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "hitbox_2_x":
-            self.player[player_int].hitbox_2_x = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "hitbox_2_y":
-            self.player[player_int].hitbox_2_y = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "hitbox_3_x":
-            self.player[player_int].hitbox_3_x = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "hitbox_3_y":
-            self.player[player_int].hitbox_3_y = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "hitbox_4_x":
-            self.player[player_int].hitbox_4_x = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "hitbox_4_y":
-            self.player[player_int].hitbox_4_y = unpack('<f', mem_update[1])[0]
-            return False
-        if label == "iasa":
-            self.player[player_int].iasa = bool(unpack('<I', mem_update[1])[0] >> 31)
+                self.player[i].off_stage = False
+
+            # Keep track of a player's invulnerability due to respawn or ledge grab
+            self.player[i].invulnerability_left = max(0, self.player[i].invulnerability_left - 1)
+            if self.player[i].action == Action.ON_HALO_WAIT:
+                self.player[i].invulnerability_left = 120
+            # Don't give invulnerability to the first descent
+            if self.player[i].action == Action.ON_HALO_DESCENT and self.frame > 150:
+                self.player[i].invulnerability_left = 120
+            if self.player[i].action == Action.EDGE_CATCHING and self.player[i].action_frame == 1:
+                self.player[i].invulnerability_left = 36
+
+            # Which character are we right now?
+            if self.player[i].character in [Character.SHEIK, Character.ZELDA]:
+                if self.player[i].transformed == self.player[i].iszelda:
+                    self.player[i].character = Character.SHEIK
+                else:
+                    self.player[i].character = Character.ZELDA
+            # If the player is transformed, then copy over the sub-character attributes
+            if self.player[i].transformed:
+                self.player[i].action = self.player[i+4].action
+                self.player[i].action_counter = self.player[i+4].action_counter
+                self.player[i].action_frame = self.player[i+4].action_frame
+                self.player[i].invulnerable = self.player[i+4].invulnerable
+                self.player[i].hitlag_frames_left = self.player[i+4].hitlag_frames_left
+                self.player[i].hitstun_frames_left = self.player[i+4].hitstun_frames_left
+                self.player[i].charging_smash = self.player[i+4].charging_smash
+                self.player[i].jumps_left = self.player[i+4].jumps_left
+                self.player[i].on_ground = self.player[i+4].on_ground
+                self.player[i].speed_air_x_self = self.player[i+4].speed_air_x_self
+                self.player[i].speed_y_self = self.player[i+4].speed_y_self
+                self.player[i].speed_x_attack = self.player[i+4].speed_x_attack
+                self.player[i].speed_y_attack = self.player[i+4].speed_y_attack
+                self.player[i].speed_ground_x_self = self.player[i+4].speed_ground_x_self
+                self.player[i].x = self.player[i+4].x
+                self.player[i].y = self.player[i+4].y
+                self.player[i].percent = self.player[i+4].percent
+                self.player[i].facing = self.player[i+4].facing
+
+            # The pre-warning occurs when we first start a dash dance.
+            if self.player[i].action == Action.DASHING and self.player[i].prev_action not in [Action.DASHING, Action.TURNING]:
+                self.player[i].moonwalkwarning = True
+
+            # Take off the warning if the player does an action other than dashing
+            if self.player[i].action != Action.DASHING:
+                self.player[i].moonwalkwarning = False
+
+        #TODO: This needs updating in order to support >2 players
+        xdist = self.ai_state.x - self.opponent_state.x
+        ydist = self.ai_state.y - self.opponent_state.y
+        self.distance = math.sqrt( (xdist**2) + (ydist**2) )
+        self.fixiasa(players)
+        self.fixframeindexing(players)
+        # Swap in the new snapshot all at once. Readers either see this whole
+        #   frame or the whole one before it
+        if self.snapshots:
+            self.publishsnapshot()
+        if self.recorder is not None:
+            self.recorder.endframe(self.frame)
+        if self.latency is not None:
+            self.latency.endframe(self)
+        return True
+
+    """The players that someone's plugged in to, as a list of (port, PlayerState)
+        Ports 5-8 hold the second character of ports 1-4, so go along with those"""
+    def activeplayers(self):
+        return [(i, player) for i, player in self.player.items() if self.player[(i - 1) % 4 + 1] \
+            .controller_status != ControllerStatus.CONTROLLER_UNPLUGGED]
+
+    """Make a snapshot of the finished frame, and swap it in as self.snapshot
+        In steady mode, the snapshot from two frames ago gets filled in again
+        rather than making a new one"""
+    def publishsnapshot(self):
+        previous = self.snapshot
+        if self.steady and self.sparesnapshot is not None:
+            self.sparesnapshot.refill(self)
+            self.snapshot = self.sparesnapshot
+        else:
+            self.snapshot = GameStateSnapshot(self, previous)
+        if self.steady:
+            self.sparesnapshot = previous
+
+    """The frame counter didn't go up by one, so keep track of what happened
+        A negative gap means the counter got reset, which isn't counted"""
+    def countgap(self, gap):
+        if gap == 0:
+            self.duplicateframes += 1
+        elif gap > 1:
+            self.droppedframes += gap - 1
+        if self.ongap is not None:
+            self.ongap(self, gap)
+
+    """Jumps are stored as the number of jumps USED
+        so we have to do some quick math to turn this into what we want"""
+    def updatejumps(self, field, payload):
+        player = self.player[field.player]
+        try:
+            totaljumps = int(self.characterdata[player.character]["Jumps"])
+            player.jumps_left = totaljumps - field.decode(payload) + 1
+        # Key error will be expected when we first start
+        except KeyError:
+            player.jumps_left = 1
+        return False
+
+    """A block of memory with several fields inside"""
+    def updateblock(self, block, payload):
+        # If the read came up short, then the memory isn't there (yet)
+        if len(payload) < block.size:
             return False
-        if label == "transformed":
-            temp = unpack('<I', mem_update[1])[0]
-            status = False
-            if temp == 16777216:
-                status = True
-            self.player[player_int].transformed = status
+        for member in block.members:
+            self.updatefield(member, payload)
+        return False
+
+    """Projectiles come in as one big block of memory"""
+    def updateprojectiles(self, field, payload):
+        #Only once per new frame that we get a projectile, clear the list out
+        if self.newframe:
+            self.projectiles.clear()
+            self.i = 0
+        self.i += 1
+        self.newframe = False
+        if len(payload) < 10:
+            self.projectiles.clear()
             return False
-        if label == "iszelda":
-            temp = unpack('<I', mem_update[1])[0]
-            status = False
-            if temp == 18:
-                status = True
-            self.player[player_int].iszelda = status
+        try:
+            subtype = enums.ProjectileSubtype(PROJECTILE_SUBTYPE.unpack_from(payload, 0x10)[0])
+        except ValueError:
             return False
-        if label == "projectiles":
-            #Only once per new frame that we get a projectile, clear the list out
-            if self.newframe:
-                self.projectiles.clear()
-                self.i = 0
-            self.i += 1
-            self.newframe = False
-            if len(mem_update[1]) < 10:
-                self.projectiles.clear()
-                return False
+        if self.steady:
+            proj = self.reuseprojectile()
+        else:
             proj = Projectile()
-            proj.x = unpack('>f', mem_update[1][0x4c:0x50])[0]
-            proj.y = unpack('>f', mem_update[1][0x50:0x54])[0]
-            proj.x_speed = unpack('>f', mem_update[1][0x40:0x44])[0]
-            proj.y_speed = unpack('>f', mem_update[1][0x44:0x48])[0]
-            try:
-                proj.subtype = enums.ProjectileSubtype(unpack('>I', mem_update[1][0x10:0x14])[0])
-            except ValueError:
-                return False
-            self.projectiles.append(proj)
+        proj.x_speed, proj.y_speed, proj.x, proj.y = PROJECTILE_MOTION.unpack_from(payload, 0x40)
+        proj.subtype = subtype
+        self.projectiles.append(proj)
         return False
 
+    """Grab the next Projectile out of the pool, rather than making a new one"""
+    def reuseprojectile(self):
+        index = len(self.projectiles)
+        if index == len(self.projectilepool):
+            self.projectilepool.append(Projectile())
+        return self.projectilepool[index]
+
+    """A copy of the projectile list that won't change out from under whoever
+        has it. Pooled projectiles get reused, so they need copying too"""
+    def copyprojectiles(self):
+        if self.steady:
+            return [copy.copy(proj) for proj in self.projectiles]
+        return list(self.projectiles)
+
     """Iterate over this class in the usual way to get memory changes."""
     def __iter__(self):
         return self
 
+    """Stop listening to dolphin and close the socket. In threaded mode, this
+        also waits for the receiver thread to finish. Don't step() after this"""
+    def close(self):
+        if self.sock is None:
+            return
+        try:
+            #Wakes up the receiver thread, if it's waiting on the socket
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        if self.receiver is not None:
+            self.receiver.join()
+            self.receiver = None
+        self.sock.close()
+        self.sock = None
+
     """Closes the socket."""
     def __del__(self):
         if self.sock != None:
@@ -464,67 +663,84 @@ class GameState:
     """
     def __next__(self):
         try:
-            data = self.sock.recvfrom(9096)[0].decode('utf-8').splitlines()
+            data = self.sock.recv(9096)
         except socket.timeout:
             return None
-        # Strip the null terminator, pad with zeros, then convert to bytes
-        return data[0], binascii.unhexlify(data[1].strip('\x00').zfill(8))
+        return decoder.parsedatagram(data)
 
 """Represents the state of a single player"""
 class PlayerState:
-    character = enums.Character.UNKNOWN_CHARACTER
-    x = 0
-    y = 0
-    percent = 0
-    stock = 0
-    facing = True
-    action = enums.Action.UNKNOWN_ANIMATION
-    action_counter = 0
-    action_frame = 0
-    invulnerable = False
-    invulnerability_left = 0
-    hitlag_frames_left = 0
-    hitstun_frames_left = 0
-    charging_smash = 0
-    jumps_left = 0
-    on_ground = True
-    speed_air_x_self = 0
-    speed_y_self = 0
-    speed_x_attack = 0
-    speed_y_attack = 0
-    speed_ground_x_self = 0
-    cursor_x = 0
-    cursor_y = 0
-    coin_down = False
-    controller_status = enums.ControllerStatus.CONTROLLER_UNPLUGGED
-    off_stage = False
-    transformed = False
-    iszelda = False
-    iasa = 0
-    moonwalkwarning = False
-    hitbox_1_size = 0
-    hitbox_2_size = 0
-    hitbox_3_size = 0
-    hitbox_4_size = 0
-    hitbox_1_status = False
-    hitbox_2_status = False
-    hitbox_3_status = False
-    hitbox_4_status = False
-    hitbox_1_x = 0
-    hitbox_1_y = 0
-    hitbox_2_x = 0
-    hitbox_2_y = 0
-    hitbox_3_x = 0
-    hitbox_3_y = 0
-    hitbox_4_x = 0
-    hitbox_4_y = 0
-    # For internal use only, ignore these
-    next_x = 0
-    next_y = 0
-    prev_x = 0
-    prev_x = 0
-    # Start from a standing state
-    prev_action = Action.UNKNOWN_ANIMATION
+    __slots__ = ["character", "x", "y", "percent", "stock", "facing", "action",
+        "action_counter", "action_frame", "invulnerable", "invulnerability_left",
+        "hitlag_frames_left", "hitstun_frames_left", "charging_smash", "jumps_left",
+        "on_ground", "speed_air_x_self", "speed_y_self", "speed_x_attack",
+        "speed_y_attack", "speed_ground_x_self", "cursor_x", "cursor_y", "coin_down",
+        "controller_status", "off_stage", "transformed", "iszelda", "iasa",
+        "moonwalkwarning", "hitbox_1_size", "hitbox_2_size", "hitbox_3_size",
+        "hitbox_4_size", "hitbox_1_status", "hitbox_2_status", "hitbox_3_status",
+        "hitbox_4_status", "hitbox_1_x", "hitbox_1_y", "hitbox_2_x", "hitbox_2_y",
+        "hitbox_3_x", "hitbox_3_y", "hitbox_4_x", "hitbox_4_y", "next_x", "next_y",
+        "prev_x", "prev_y", "prev_action"]
+
+    def __init__(self):
+        self.character = enums.Character.UNKNOWN_CHARACTER
+        self.x = 0
+        self.y = 0
+        self.percent = 0
+        self.stock = 0
+        self.facing = True
+        self.action = enums.Action.UNKNOWN_ANIMATION
+        self.action_counter = 0
+        self.action_frame = 0
+        self.invulnerable = False
+        self.invulnerability_left = 0
+        self.hitlag_frames_left = 0
+        self.hitstun_frames_left = 0
+        self.charging_smash = 0
+        self.jumps_left = 0
+        self.on_ground = True
+        self.speed_air_x_self = 0
+        self.speed_y_self = 0
+        self.speed_x_attack = 0
+        self.speed_y_attack = 0
+        self.speed_ground_x_self = 0
+        self.cursor_x = 0
+        self.cursor_y = 0
+        self.coin_down = False
+        self.controller_status = enums.ControllerStatus.CONTROLLER_UNPLUGGED
+        self.off_stage = False
+        self.transformed = False
+        self.iszelda = False
+        self.iasa = 0
+        self.moonwalkwarning = False
+        self.hitbox_1_size = 0
+        self.hitbox_2_size = 0
+        self.hitbox_3_size = 0
+        self.hitbox_4_size = 0
+        self.hitbox_1_status = False
+        self.hitbox_2_status = False
+        self.hitbox_3_status = False
+        self.hitbox_4_status = False
+        self.hitbox_1_x = 0
+        self.hitbox_1_y = 0
+        self.hitbox_2_x = 0
+        self.hitbox_2_y = 0
+        self.hitbox_3_x = 0
+        self.hitbox_3_y = 0
+        self.hitbox_4_x = 0
+        self.hitbox_4_y = 0
+        # For internal use only, ignore these
+        self.next_x = 0
+        self.next_y = 0
+        self.prev_x = 0
+        self.prev_y = 0
+        # Start from a standing state
+        self.prev_action = Action.UNKNOWN_ANIMATION
+
+    """Copy over the state of another player"""
+    def copyfrom(self, other):
+        for name, value in zip(PlayerState.__slots__, getplayerstate(other)):
+            setattr(self, name, value)
 
     """Produces a list representation of the player's state"""
     def tolist(self):
@@ -550,6 +766,128 @@ class PlayerState:
         thelist.append(int(self.off_stage))
         return thelist
 
+"""A read-only copy of a GameState, as it was at the end of a frame
+    Nothing in here changes after it's made, so it's safe to hand off to other
+    threads. Made by GameState when it's created with snapshots=True. (Except
+    in steady mode, where GameState refills old snapshots)
+    previous = The snapshot of the frame before. Players that nobody's plugged
+        in to get shared with it, rather than copied again"""
+class GameStateSnapshot:
+    def __init__(self, gamestate, previous=None):
+        values = self.__dict__
+        self.fillframe(gamestate)
+        active = {port for port, player in gamestate.activeplayers()}
+        players = dict()
+        for i, player in gamestate.player.items():
+            if previous is not None and i not in active:
+                players[i] = previous.player[i]
+            else:
+                players[i] = PlayerSnapshot(player)
+            if player is gamestate.ai_state:
+                values["ai_state"] = players[i]
+            if player is gamestate.opponent_state:
+                values["opponent_state"] = players[i]
+        values["player"] = MappingProxyType(players)
+        values["ai_states"] = MappingProxyType({port: players[port] for port in gamestate.ai_states})
+
+    """Copy over the frame attributes and projectiles"""
+    def fillframe(self, gamestate):
+        values = self.__dict__
+        for name in FRAMEATTRIBUTES:
+            values[name] = getattr(gamestate, name)
+        values["projectiles"] = tuple(gamestate.copyprojectiles())
+
+    """Copy a newer frame over this one, in place. Only for steady mode"""
+    def refill(self, gamestate):
+        self.fillframe(gamestate)
+        for port, player in gamestate.activeplayers():
+            self.player[port].fill(player)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GameState snapshots are read only")
+
+    tolist = GameState.tolist
+
+"""A read-only copy of a PlayerState
+    Lazy players get fully decoded, since the snapshot can't change later.
+    Like GameStateSnapshot, it keeps its values in a plain __dict__ that gets
+    filled in one go, rather than in PlayerState's slots. Going through the
+    slots means a call per attribute, which made each one about 5x slower"""
+class PlayerSnapshot:
+    def __init__(self, player):
+        self.fill(player)
+
+    """Copy a player's attributes in. Only GameStateSnapshot.refill() calls
+        this again, after the snapshot's made"""
+    def fill(self, player):
+        self.__dict__.update(zip(PlayerState.__slots__, getplayerstate(player)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PlayerState snapshots are read only")
+
+    tolist = PlayerState.tolist
+
+"""An attribute of a LazyPlayerState that only gets decoded when it's read
+    The latest payload from dolphin waits in the player's pending dict. The
+    first read after it arrives decodes it, and that value is kept until
+    another payload shows up (or someone sets the attribute directly)
+    NOTE: If a payload doesn't decode, we fall back to the last value that was
+    actually read. Not the last one dolphin sent that would have decoded."""
+class LazyAttribute:
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, player, owner):
+        if player is None:
+            return self
+        payload = player.pending.pop(self.name, None)
+        if payload is not None:
+            try:
+                player.values[self.name] = player.lazyfields[self.name].decode(payload)
+            except (ValueError, OverflowError):
+                pass
+        return player.values[self.name]
+
+    def __set__(self, player, value):
+        player.pending.pop(self.name, None)
+        player.values[self.name] = value
+
+"""A PlayerState that only decodes its fields when they are read
+    Most bots only look at a handful of fields each frame, so there's no
+    sense in decoding all of them for all 8 players"""
+class LazyPlayerState(PlayerState):
+    __slots__ = ["pending", "values", "lazyfields"]
+    #Names of the attributes that aren't lazy. Filled in below
+    eager = []
+
+    def __init__(self):
+        #Dict of attribute name to the latest raw payload that hasn't been decoded
+        self.pending = dict()
+        #Dict of attribute name to decoded value
+        self.values = dict()
+        #Dict of attribute name to the Field that decodes it
+        self.lazyfields = dict()
+        PlayerState.__init__(self)
+
+    """Copy over the state of another player, without sharing any of the dicts"""
+    def copyfrom(self, other):
+        for name in LazyPlayerState.eager:
+            setattr(self, name, getattr(other, name))
+        self.pending = dict(other.pending)
+        self.values = dict(other.values)
+
+#Everything that's a plain store in the decoder can be lazy
+for name, spec in decoder.SPECS.items():
+    fmt, shift, mask, convert, attribute, previous, handler = spec
+    attribute = attribute or name
+    if handler is None and previous is None and attribute in PlayerState.__slots__:
+        setattr(LazyPlayerState, attribute, LazyAttribute(attribute))
+LazyPlayerState.eager = [name for name in PlayerState.__slots__ \
+    if not isinstance(getattr(LazyPlayerState, name), LazyAttribute)]
+
+#Reads every attribute of a player at once, as a tuple in __slots__ order
+getplayerstate = attrgetter(*PlayerState.__slots__)
+
 """Represents the state of a projectile (items, lasers, etc...)"""
 class Projectile:
     x = 0
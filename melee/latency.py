@@ -0,0 +1,180 @@
+"""Measures how many frames it takes for the bot's inputs to show up in the game
+Each input that a Controller flushes gets stamped with the last frame the bot
+saw, and the time. Then as GameState finishes each frame, action changes get
+matched up to the inputs waiting on them. So pressing B with the stick down
+can be timed from the flush to the first frame of DOWN_B_GROUND_START.
+
+For a frame-perfect technique, the action should change on the very next
+frame. Anything more than that is the pipe, or the bot, running late."""
+from collections import Counter, deque
+from time import monotonic
+import functools
+import threading
+
+from melee import enums
+from melee.controller import BUTTON_BITS, BUTTON_MASK, MAIN_X_SHIFT, MAIN_Y_SHIFT, \
+    C_X_SHIFT, C_Y_SHIFT, STICK_CENTER
+
+#How far off center a stick has to be, out of 128, to count as pointing somewhere
+STICK_THRESHOLD = 38
+#The name each button goes by in an input's name
+BUTTON_NAMES = [(bit, button.value) for button, bit in sorted(BUTTON_BITS.items(), \
+    key=lambda item: item[1])]
+
+#Actions that some common inputs are expected to lead to. Pass as expect to
+#   LatencyTracker to only time those
+TECHSKILL_ACTIONS = {
+    "B+MAIN_DOWN": {enums.Action.DOWN_B_GROUND_START, enums.Action.DOWN_B_STUN,
+        enums.Action.DOWN_B_AIR},
+    "X": {enums.Action.KNEE_BEND, enums.Action.JUMPING_FORWARD},
+    "Y": {enums.Action.KNEE_BEND, enums.Action.JUMPING_FORWARD},
+    "A": {enums.Action.NEUTRAL_ATTACK_1},
+    "MAIN_LEFT": {enums.Action.DASHING, enums.Action.TURNING},
+    "MAIN_RIGHT": {enums.Action.DASHING, enums.Action.TURNING},
+    "C_UP": {enums.Action.UPSMASH},
+}
+
+"""Which way a stick is pointing, or None if it's about in the middle
+    x, y = The stick's raw bytes"""
+def stickdirection(x, y):
+    x -= STICK_CENTER
+    y -= STICK_CENTER
+    if max(abs(x), abs(y)) < STICK_THRESHOLD:
+        return None
+    if abs(x) > abs(y):
+        return "RIGHT" if x > 0 else "LEFT"
+    return "UP" if y > 0 else "DOWN"
+
+"""Name the new input in a change of controller state, like "B+MAIN_DOWN"
+    Made up of the buttons that just got pressed, and the sticks that just got
+    pointed somewhere new. Returns None if nothing new was put in, like when
+    buttons are only let go of
+    current, previous = Packed ControllerState values. previous can be None"""
+@functools.lru_cache(maxsize=4096)
+def inputname(current, previous):
+    if previous is None:
+        previous = 0
+    names = []
+    pressed = current & ~previous & BUTTON_MASK
+    for bit, name in BUTTON_NAMES:
+        if pressed >> bit & 1:
+            names.append(name)
+    for stick, xshift, yshift in [("MAIN", MAIN_X_SHIFT, MAIN_Y_SHIFT), ("C", C_X_SHIFT, C_Y_SHIFT)]:
+        direction = stickdirection(current >> xshift & 0xff, current >> yshift & 0xff)
+        if direction is not None and direction != \
+                stickdirection(previous >> xshift & 0xff, previous >> yshift & 0xff):
+            names.append(stick + "_" + direction)
+    if not names:
+        return None
+    return "+".join(names)
+
+"""Times inputs from the controller pipe to the game, and keeps a histogram of
+    how many frames each kind of input took. Hand the same one to a GameState
+    and to its Controllers, as latency=
+    expect = Dict of input name to the set of actions that input leads to. Only
+        inputs named in it get timed, and only by a change into one of those
+        actions. None times every input, by the next action change at all
+    window = How many frames to wait for an input to show up, before counting
+        it as missed"""
+class LatencyTracker:
+    def __init__(self, expect=None, window=30):
+        self.expect = expect
+        self.window = window
+        #The last frame counter the game sent, which is the one the bot is
+        #   reacting to when it flushes
+        self.frame = 0
+        #Whether frames finish decoding on another thread from the bot's. Then
+        #   the newest frame decoded can be ahead of the one the bot is on, so
+        #   GameState.step() says which one it handed over through consumed()
+        self.threaded = False
+        #Dict of port to deque of (input name, frame, time, expected actions).
+        #   Written by the bot, read wherever the GameState is decoding
+        self.pending = dict()
+        #Guards frame and pending, since in threaded mode the bot flushes on
+        #   one thread while frames finish on the receiver thread
+        self.lock = threading.Lock()
+        #Dict of port to the action it was in as of the last frame
+        self.actions = dict()
+        #Dict of input name to Counter of how many frames it took
+        self.frames = dict()
+        #Dict of input name to Counter of how many milliseconds it took
+        self.times = dict()
+        #Counter of inputs that never showed up, by name
+        self.missed = Counter()
+
+    """A Controller flushed a change of inputs. Called from Controller
+        port = The controller's port
+        current, previous = The packed state it sent, and the one before"""
+    def flushed(self, port, current, previous):
+        name = inputname(current, previous)
+        if name is None:
+            return
+        expected = None
+        if self.expect is not None:
+            expected = self.expect.get(name)
+            if expected is None:
+                return
+        with self.lock:
+            pending = self.pending.get(port)
+            if pending is None:
+                pending = self.pending[port] = deque()
+            pending.append((name, self.frame, monotonic(), expected))
+
+    """The bot got handed a frame. Called from GameState in threaded mode
+        frame = The frame counter of the frame the bot is now on"""
+    def consumed(self, frame):
+        with self.lock:
+            self.frame = frame
+
+    """A frame finished decoding. Match any action changes up to the inputs
+        that caused them. Called from GameState"""
+    def endframe(self, gamestate):
+        now = monotonic()
+        with self.lock:
+            if not self.threaded:
+                self.frame = gamestate.frame
+            for port, player in gamestate.ai_states.items():
+                action = player.action
+                changed = action != self.actions.get(port, action)
+                self.actions[port] = action
+                pending = self.pending.get(port)
+                while pending and gamestate.frame - pending[0][1] > self.window:
+                    self.missed[pending[0][0]] += 1
+                    pending.popleft()
+                if not changed or not pending:
+                    continue
+                for i, (name, frame, flushed, expected) in enumerate(pending):
+                    if expected is None or action in expected:
+                        del pending[i]
+                        self.frames.setdefault(name, Counter())[gamestate.frame - frame] += 1
+                        self.times.setdefault(name, Counter())[int((now - flushed) * 1000)] += 1
+                        break
+
+    """Each kind of input that's been timed, with how many frames it took as a
+        sorted list of (frames, count)"""
+    def histograms(self):
+        return {name: sorted(counts.items()) for name, counts in self.frames.items()}
+
+    """A line of text per kind of input, summing up how long it took"""
+    def report(self):
+        lines = []
+        for name in sorted(set(self.frames) | set(self.missed)):
+            frames = self.frames.get(name, Counter())
+            times = self.times.get(name, Counter())
+            seen = sum(frames.values())
+            line = "%s: %d seen, %d missed" % (name, seen, self.missed[name])
+            if seen:
+                line += ", frames " + " ".join("%d:%d" % item for item in sorted(frames.items()))
+                line += ", p50 %dms, max %dms" % (percentile(times, .5), max(times))
+            lines.append(line)
+        return "\n".join(lines)
+
+"""The value that a fraction of the way through a Counter's values falls on"""
+def percentile(counts, fraction):
+    target = fraction * sum(counts.values())
+    total = 0
+    for value, count in sorted(counts.items()):
+        total += count
+        if total >= target:
+            return value
+    return 0
@@ -0,0 +1,121 @@
+"""Input sequences that play themselves out, one frame at a time
+A Macro is worked out ahead of time from a list of steps, then handed to
+Controller.play(). After that, each Controller.flush() picks the inputs for the
+frame straight out of the macro's tables, without running any bot code. So
+frame-perfect sequences stay frame-perfect, and cost next to nothing.
+
+Each step is (offset, trigger, inputs):
+    offset = How many frames after the trigger to send the inputs. 0 is the
+        same frame the trigger was seen on
+    trigger = When to start counting. One of:
+        None, for the frame the macro started on
+        An Action, for any frame the player is in that action
+        (Action, frames), for when the player is in that action on one of the
+        given action frames. frames can be a single frame number, or a range
+        or list of them
+    inputs = A ControllerState, a packed ControllerState value, or None for
+        everything let go
+If more than one step lands on the same frame, ones set off by an action win
+over ones timed from the start, and otherwise the last one in the list wins."""
+from melee.controller import ControllerState, NEUTRAL_VALUE, BUTTON_BITS
+
+#Keep sending whatever was sent last, when nothing's scheduled
+HOLD = -1
+
+"""Make the packed value for a set of inputs, for use in a macro step
+    buttons = Buttons to hold down
+    main, c = Where to put the sticks, as (x, y)
+    l, r = How far down to press the analog shoulders"""
+def inputs(buttons=(), main=(.5, .5), c=(.5, .5), l=0, r=0):
+    state = ControllerState()
+    for button in buttons:
+        state.value |= 1 << BUTTON_BITS[button]
+    state.main_stick = main
+    state.c_stick = c
+    state.l_shoulder = l
+    state.r_shoulder = r
+    return state.value
+
+"""Turn a step's inputs into a packed value"""
+def packinputs(value):
+    if value is None:
+        return NEUTRAL_VALUE
+    if isinstance(value, ControllerState):
+        return value.value
+    return value
+
+"""A sequence of inputs, worked out ahead of time
+    steps = List of (offset, trigger, inputs). See the top of this file
+    default = What to send on frames where no step lands. None for neutral,
+        HOLD to keep sending the last inputs, or any other inputs
+    length = How many frames the macro runs for. Defaults to just past the
+        last step that's timed from the start, if every step is. Otherwise it
+        runs until Controller.stop_macro()"""
+class Macro:
+    def __init__(self, steps, default=None, length=None):
+        #Dict of offset from the start to packed inputs
+        self.timed = dict()
+        #Dict of action to list of (set of action frames or None, offset, packed inputs)
+        self.triggers = dict()
+        for offset, trigger, value in steps:
+            value = packinputs(value)
+            if trigger is None:
+                self.timed[offset] = value
+                continue
+            if isinstance(trigger, tuple):
+                action, frames = trigger
+                if isinstance(frames, int):
+                    frames = [frames]
+                frames = frozenset(frames)
+            else:
+                action = trigger
+                frames = None
+            self.triggers.setdefault(action, []).append((frames, offset, value))
+        self.hold = default == HOLD
+        self.default = NEUTRAL_VALUE if self.hold else packinputs(default)
+        if length is None and not self.triggers and self.timed:
+            length = max(self.timed) + 1
+        self.length = length
+        #The furthest ahead that anything can be scheduled
+        self.lookahead = max([offset for offset, trigger, value in steps] + [0]) + 1
+
+    """Start playing the macro for the given player. Returns a MacroRun
+        player = The PlayerState whose action sets off the triggers"""
+    def start(self, player):
+        return MacroRun(self, player)
+
+"""One play-through of a Macro. Controller.flush() calls next() once a frame"""
+class MacroRun:
+    def __init__(self, macro, player):
+        self.macro = macro
+        self.player = player
+        #How many frames the macro has been going for
+        self.frame = 0
+        #Inputs scheduled by triggers, in a ring buffer indexed by frame
+        self.scheduled = [None] * macro.lookahead
+        self.last = macro.default
+
+    """The packed inputs for this frame, or None if the macro is over"""
+    def next(self):
+        macro = self.macro
+        frame = self.frame
+        if macro.length is not None and frame >= macro.length:
+            return None
+        self.frame += 1
+        scheduled = self.scheduled
+        lookahead = len(scheduled)
+        rules = macro.triggers.get(self.player.action)
+        if rules:
+            action_frame = self.player.action_frame
+            for frames, offset, value in rules:
+                if frames is None or action_frame in frames:
+                    scheduled[(frame + offset) % lookahead] = value
+        slot = frame % lookahead
+        value = scheduled[slot]
+        scheduled[slot] = None
+        if value is None:
+            value = macro.timed.get(frame)
+        if value is None:
+            value = self.last if macro.hold else macro.default
+        self.last = value
+        return value
@@ -1,7 +1,7 @@
-import binascii
 import os
 import socket
 import dolphin
+from melee import decoder
 
 class MemoryWatcher:
     """Reads and parses game memory changes.
@@ -33,8 +33,7 @@ class MemoryWatcher:
     """
     def __next__(self):
         try:
-            data = self.sock.recvfrom(9096)[0].decode('utf-8').splitlines()
+            data = self.sock.recv(9096)
         except socket.timeout:
             return None
-        # Strip the null terminator, pad with zeros, then convert to bytes
-        return data[0], binascii.unhexlify(data[1].strip('\x00').zfill(8))
+        return decoder.parsedatagram(data)
@@ -0,0 +1,235 @@
+"""Records the raw memory updates from dolphin into a compact binary log
+Unlike Logger, this keeps every single update exactly as it came in, so whole
+matches can be captured and picked apart later on.
+
+The log is append-only, and made up of records like so:
+    arrival time (monotonic nanoseconds, uint64)
+    address id (uint16)
+    value length (uint16)
+    value (the four byte payload, or however long a block is)
+All little endian. The arrival time is when the frame that the update is part
+of finished coming in, so every record in a frame has the same one. A value
+that dolphin sent as something other than hex is kept as the text it sent.
+Address ids are given out as addresses are seen. Each one is defined by a
+record with ADDRESS_DEFINITION as its address id, and a value of the new id
+(uint16) followed by the address as dolphin sends it.
+
+Next to the log is an index (path + ".index") with one entry per frame:
+    frame counter (uint32), start offset (uint64), end offset (uint64)
+That's where the records for that frame sit in the log, so the log can be
+memory mapped and jumped around in by frame."""
+import binascii
+import mmap
+import os
+import queue
+import struct
+import threading
+from time import monotonic_ns
+
+MAGIC = b"MELEEREC"
+VERSION = 1
+HEADER = struct.Struct("<8sI")
+RECORD = struct.Struct("<QHH")
+INDEX = struct.Struct("<IQQ")
+#The address id that marks a record as defining a new address id
+ADDRESS_DEFINITION = 0xFFFF
+ADDRESS_ID = struct.Struct("<H")
+
+"""Writes memory updates to a log file as they come in
+    The hot path only ever appends the update to a list, as the raw address and
+    hex that dolphin sent. At the end of each frame the list is handed off to a
+    background thread, which does the decoding and packing and writes it out
+    path = Where to write the log. The index goes at path + ".index"
+    buffersize = How many bytes the log file buffers before writing them out
+    backlog = How many frames can wait to be written. If the disk can't keep up
+        with that many, recording waits for it"""
+class Recorder:
+    def __init__(self, path, buffersize=1 << 20, backlog=600):
+        self.path = path
+        self.logfile = open(path, "wb", buffering=buffersize)
+        self.indexfile = open(path + ".index", "wb")
+        self.logfile.write(HEADER.pack(MAGIC, VERSION))
+        #How far into the log file the next record will be. Only the writer
+        #   thread touches this, and the ids
+        self.offset = HEADER.size
+        #Where the current frame's records started
+        self.framestart = self.offset
+        #Dict of raw address bytes to address id
+        self.ids = dict()
+        #List of (raw address, raw hex value) that have come in this frame
+        self.updates = []
+        #Finished frames waiting to be written, as (frame counter or None,
+        #   arrival time, updates)
+        self.frames = queue.Queue(backlog)
+        self.writer = threading.Thread(target=self.write, daemon=True)
+        self.writer.start()
+
+    """Give ids to a bunch of addresses up front, so that they're all defined
+        at the start of the log. GameState does this with its dispatch table
+        addresses = Iterable of raw address bytes"""
+    def define(self, addresses):
+        self.frames.put((None, monotonic_ns(), [(address, None) for address in addresses]))
+
+    """Record one memory update, as it arrived from dolphin
+        address = The raw address bytes. value = The raw hex bytes that came
+            with it, null terminator and all"""
+    def record(self, address, value):
+        self.updates.append((address, value))
+
+    """The frame counter came in, so the frame is done. Hand it off to be written"""
+    def endframe(self, frame):
+        self.frames.put((frame, monotonic_ns(), self.updates))
+        self.updates = []
+
+    """Look up the id for an address, defining a new one if need be. Runs on
+        the writer thread
+        out = The bytearray to put the definition in"""
+    def addressid(self, address, out):
+        addressid = self.ids.get(address)
+        if addressid is None:
+            addressid = len(self.ids)
+            self.ids[address] = addressid
+            value = ADDRESS_ID.pack(addressid) + address
+            out += RECORD.pack(0, ADDRESS_DEFINITION, len(value))
+            out += value
+        return addressid
+
+    """Decode and pack one frame's updates into records. Runs on the writer thread"""
+    def pack(self, arrival, updates):
+        out = bytearray()
+        ids = self.ids
+        for address, value in updates:
+            addressid = ids.get(address)
+            if addressid is None:
+                addressid = self.addressid(address, out)
+            if value is None:
+                #Only here to be defined
+                continue
+            # Strip the null terminator, pad with zeros, then convert to bytes
+            value = value.rstrip(b'\x00').zfill(8)
+            try:
+                payload = binascii.unhexlify(value)
+            except binascii.Error:
+                payload = value
+            out += RECORD.pack(arrival, addressid, len(payload))
+            out += payload
+        return out
+
+    """Write out frames as they come in, until handed None. Runs on the writer thread"""
+    def write(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                self.frames.task_done()
+                return
+            frame, arrival, updates = item
+            out = self.pack(arrival, updates)
+            self.logfile.write(out)
+            self.offset += len(out)
+            if frame is not None:
+                self.indexfile.write(INDEX.pack(frame, self.framestart, self.offset))
+                self.framestart = self.offset
+            self.frames.task_done()
+
+    """Hand off anything from a frame that hasn't finished yet. It goes in the
+        log, but not the index"""
+    def handoff(self):
+        if self.updates:
+            self.frames.put((None, monotonic_ns(), self.updates))
+            self.updates = []
+
+    """Write out everything recorded so far, and wait for it to hit the file"""
+    def flush(self):
+        self.handoff()
+        self.frames.join()
+        self.logfile.flush()
+        self.indexfile.flush()
+
+    """Finish up the log. Nothing more can be recorded after this"""
+    def close(self):
+        if self.logfile.closed:
+            return
+        self.handoff()
+        self.frames.put(None)
+        self.writer.join()
+        self.logfile.close()
+        self.indexfile.close()
+
+"""A log written by Recorder, memory mapped for reading"""
+class Recording:
+    def __init__(self, path):
+        with open(path, "rb") as logfile:
+            self.log = mmap.mmap(logfile.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self.log)
+        if magic != MAGIC:
+            raise ValueError(path + " isn't a recording")
+        if version != VERSION:
+            raise ValueError("Unsupported recording version: " + str(version))
+        #List of (frame, start offset, end offset)
+        self.index = []
+        if os.path.exists(path + ".index"):
+            with open(path + ".index", "rb") as indexfile:
+                self.index = list(INDEX.iter_unpack(indexfile.read()))
+        #List with a dict per game, of frame counter to (start offset, end
+        #   offset). The frame counter starts over with each game, so a new
+        #   game begins wherever it goes backwards
+        self.games = []
+        lastframe = None
+        for frame, start, end in self.index:
+            if lastframe is None or frame < lastframe:
+                self.games.append(dict())
+            self.games[-1][frame] = (start, end)
+            lastframe = frame
+        #Dict of address id to address string
+        self.addresses = dict()
+        #Pick up the addresses defined up front, by reading up to the first update
+        next(self.records(), None)
+
+    """List of the frame counters that were recorded, in order. They start over
+        with each game"""
+    def frames(self):
+        return [frame for frame, start, end in self.index]
+
+    """Iterate over the records between two offsets in the log, as tuples of
+        (arrival time in nanoseconds, address string, value bytes)
+        Address definitions are taken in along the way, and not returned"""
+    def records(self, start=HEADER.size, end=None):
+        log = self.log
+        if end is None:
+            end = len(log)
+        offset = start
+        while offset + RECORD.size <= end:
+            arrival, addressid, length = RECORD.unpack_from(log, offset)
+            offset += RECORD.size
+            value = log[offset:offset + length]
+            offset += length
+            if addressid == ADDRESS_DEFINITION:
+                self.addresses[ADDRESS_ID.unpack_from(value)[0]] = value[ADDRESS_ID.size:].decode()
+                continue
+            address = self.addresses.get(addressid)
+            if address is None:
+                # Defined somewhere we skipped over, so go find it
+                self.findaddresses()
+                address = self.addresses[addressid]
+            yield arrival, address, value
+
+    """Read through the whole log, just for the address definitions"""
+    def findaddresses(self):
+        log = self.log
+        offset = HEADER.size
+        while offset + RECORD.size <= len(log):
+            arrival, addressid, length = RECORD.unpack_from(log, offset)
+            offset += RECORD.size
+            if addressid == ADDRESS_DEFINITION:
+                value = log[offset:offset + length]
+                self.addresses[ADDRESS_ID.unpack_from(value)[0]] = value[ADDRESS_ID.size:].decode()
+            offset += length
+
+    """The records for one frame, by its frame counter
+        game = Which game in the log the frame is from, counting from 0"""
+    def frame(self, frame, game=0):
+        start, end = self.games[game][frame]
+        return self.records(start, end)
+
+    def close(self):
+        self.log.close()
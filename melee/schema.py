@@ -0,0 +1,339 @@
+"""Describes every memory location that libmelee knows how to watch
+Everything else is generated from this: the Locations.txt that dolphin reads,
+locations.csv, and the decoder that GameState runs each update through.
+Pass a list of labels to only watch the fields your bot actually needs.
+
+Run this module directly to regenerate the Locations.txt and locations.csv
+    that ship with libmelee"""
+from melee import enums
+import csv
+import os
+
+"""Make a converter that looks up an enum value, falling back to a default
+    if Melee hands us something we don't know about"""
+def enumconverter(enumtype, default):
+    def convert(value):
+        try:
+            return enumtype(value)
+        except ValueError:
+            return default
+    return convert
+
+"""Floats that really represent frame counts. A NaN raises ValueError, and an
+    infinity OverflowError, either of which leaves the old value in place"""
+def floattoint(value):
+    return int(value)
+
+"""Sub-player percents are stored as a float, rather than a shifted int"""
+def floatpercent(value):
+    try:
+        return int(value)
+    except (ValueError, OverflowError):
+        return 0
+
+"""How to decode each label in locations.csv
+    label: (struct format, shift, mask, converter, attribute, previous, handler)"""
+SPECS = {
+    "frame": ('<I', 0, 0, None, None, None, "updateframe"),
+    "stage": ('<I', 16, 0xff, enumconverter(enums.Stage, enums.Stage.NO_STAGE), None, None, None),
+    "menu_state": ('<I', 0, 0xff, enums.Menu, None, None, None),
+    "percent": ('<I', 16, 0, None, None, None, None),
+    "stock": ('<I', 24, 0, None, None, None, None),
+    "facing": ('<I', 31, 0, lambda value: not bool(value), None, None, None),
+    "x": ('<f', 0, 0, None, "next_x", None, None),
+    "y": ('<f', 0, 0, None, "next_y", None, None),
+    "character": ('<I', 24, 0, enumconverter(enums.Character, enums.Character.UNKNOWN_CHARACTER), None, None, None),
+    "cursor_x": ('<f', 0, 0, None, None, None, None),
+    "cursor_y": ('<f', 0, 0, None, None, None, None),
+    "action": ('<I', 0, 0, enumconverter(enums.Action, enums.Action.UNKNOWN_ANIMATION), None, "prev_action", None),
+    #TODO look if this is backwards
+    "action_counter": ('I', 8, 0, None, None, None, None),
+    "action_frame": ('<f', 0, 0, floattoint, None, None, None),
+    "invulnerable": ('<I', 31, 0, None, None, None, None),
+    "hitlag_frames_left": ('<f', 0, 0, floattoint, None, None, None),
+    "hitstun_frames_left": ('<f', 0, 0, floattoint, None, None, None),
+    "charging_smash": ('<I', 0, 0, lambda value: value == 2, None, None, None),
+    "jumps_left": ('<I', 24, 0, None, None, None, "updatejumps"),
+    "on_ground": ('<I', 0, 0, lambda value: value == 0, None, None, None),
+    "speed_air_x_self": ('<f', 0, 0, None, None, None, None),
+    "speed_y_self": ('<f', 0, 0, None, None, None, None),
+    "speed_x_attack": ('<f', 0, 0, None, None, None, None),
+    "speed_y_attack": ('<f', 0, 0, None, None, None, None),
+    "speed_ground_x_self": ('<f', 0, 0, None, None, None, None),
+    "coin_down": ('<I', 0, 0xff, lambda value: value == 2, None, None, None),
+    "stage_select_cursor_x": ('<f', 0, 0, None, None, None, None),
+    "stage_select_cursor_y": ('<f', 0, 0, None, None, None, None),
+    "ready_to_start": ('>I', 0, 0xff, lambda value: not bool(value), None, None, None),
+    "controller_status": ('>I', 0, 0xff, enums.ControllerStatus, None, None, None),
+    "hitbox_1_size": ('<f', 0, 0, None, None, None, None),
+    "hitbox_2_size": ('<f', 0, 0, None, None, None, None),
+    "hitbox_3_size": ('<f', 0, 0, None, None, None, None),
+    "hitbox_4_size": ('<f', 0, 0, None, None, None, None),
+    "hitbox_1_status": ('<I', 0, 0, bool, None, None, None),
+    "hitbox_2_status": ('<I', 0, 0, bool, None, None, None),
+    "hitbox_3_status": ('<I', 0, 0, bool, None, None, None),
+    "hitbox_4_status": ('<I', 0, 0, bool, None, None, None),
+    "hitbox_1_x": ('<f', 0, 0, None, None, None, None),
+    "hitbox_1_y": ('<f', 0, 0, None, None, None, None),
+    "hitbox_2_x": ('<f', 0, 0, None, None, None, None),
+    "hitbox_2_y": ('<f', 0, 0, None, None, None, None),
+    "hitbox_3_x": ('<f', 0, 0, None, None, None, None),
+    "hitbox_3_y": ('<f', 0, 0, None, None, None, None),
+    "hitbox_4_x": ('<f', 0, 0, None, None, None, None),
+    "hitbox_4_y": ('<f', 0, 0, None, None, None, None),
+    "iasa": ('<I', 31, 0, bool, None, None, None),
+    "transformed": ('<I', 0, 0, lambda value: value == 16777216, None, None, None),
+    "iszelda": ('<I', 0, 0, lambda value: value == 18, None, None, None),
+    "projectiles": ('<I', 0, 0, None, None, None, "updateprojectiles"),
+}
+
+#Sub-players (Sheik/Zelda, Nana) keep their percent somewhere else entirely
+SUBPLAYER_PERCENT = ('<f', 0, 0, floatpercent, None, None, None)
+
+"""Every watched address, in the order that dolphin is told about them
+    (label, address, player). Player 0 means the GameState itself"""
+LOCATIONS = [
+    #Percent, stock, facing and position for each player
+    ("percent", "004530E0", 1),
+    ("percent", "00453F70", 2),
+    ("percent", "00454E00", 3),
+    ("percent", "00455C90", 4),
+    ("stock", "0045310E", 1),
+    ("stock", "00453F9E", 2),
+    ("stock", "00454E2E", 3),
+    ("stock", "00455CBE", 4),
+    ("facing", "004530C0", 1),
+    ("facing", "00453F50", 2),
+    ("facing", "00454DE0", 3),
+    ("facing", "00455C70", 4),
+    ("x", "00453090", 1),
+    ("x", "00453F20", 2),
+    ("x", "00454DB0", 3),
+    ("x", "00455C40", 4),
+    ("y", "00453094", 1),
+    ("y", "00453F24", 2),
+    ("y", "00454DB4", 3),
+    ("y", "00455C44", 4),
+    #Action and movement state for each player
+    ("action", "00453130 70", 1),
+    ("action_counter", "00453130 20CC", 1),
+    ("action_frame", "00453130 8F4", 1),
+    ("invulnerable", "00453130 19EC", 1),
+    ("hitlag_frames_left", "00453130 19BC", 1),
+    ("hitstun_frames_left", "00453130 23a0", 1),
+    ("charging_smash", "00453130 2174", 1),
+    ("jumps_left", "00453130 19C8", 1),
+    ("on_ground", "00453130 140", 1),
+    ("speed_air_x_self", "00453130 E0", 1),
+    ("speed_y_self", "00453130 E4", 1),
+    ("speed_x_attack", "00453130 EC", 1),
+    ("speed_y_attack", "00453130 F0", 1),
+    ("speed_ground_x_self", "00453130 14C", 1),
+    ("action", "00453FC0 70", 2),
+    ("action_counter", "00453FC0 20CC", 2),
+    ("action_frame", "00453FC0 8F4", 2),
+    ("invulnerable", "00453FC0 19EC", 2),
+    ("hitlag_frames_left", "00453FC0 19BC", 2),
+    ("hitstun_frames_left", "00453FC0 23a0", 2),
+    ("charging_smash", "00453FC0 2174", 2),
+    ("jumps_left", "00453FC0 19C8", 2),
+    ("on_ground", "00453FC0 140", 2),
+    ("speed_air_x_self", "00453FC0 E0", 2),
+    ("speed_y_self", "00453FC0 E4", 2),
+    ("speed_x_attack", "00453FC0 EC", 2),
+    ("speed_y_attack", "00453FC0 F0", 2),
+    ("speed_ground_x_self", "00453FC0 14C", 2),
+    ("action", "00454E50 70", 3),
+    ("action_counter", "00454E50 20CC", 3),
+    ("action_frame", "00454E50 8F4", 3),
+    ("invulnerable", "00454E50 19EC", 3),
+    ("hitlag_frames_left", "00454E50 19BC", 3),
+    ("hitstun_frames_left", "00454E50 23a0", 3),
+    ("charging_smash", "00454E50 2174", 3),
+    ("jumps_left", "00454E50 19C8", 3),
+    ("on_ground", "00454E50 140", 3),
+    ("speed_air_x_self", "00454E50 E0", 3),
+    ("speed_y_self", "00454E50 E4", 3),
+    ("speed_x_attack", "00454E50 EC", 3),
+    ("speed_y_attack", "00454E50 F0", 3),
+    ("speed_ground_x_self", "00454E50 14C", 3),
+    ("action", "00455CE0 70", 4),
+    ("action_counter", "00455CE0 20CC", 4),
+    ("action_frame", "00455CE0 8F4", 4),
+    ("invulnerable", "00455CE0 19EC", 4),
+    ("hitlag_frames_left", "00455CE0 19BC", 4),
+    ("hitstun_frames_left", "00455CE0 23a0", 4),
+    ("charging_smash", "00455CE0 2174", 4),
+    ("jumps_left", "00455CE0 19C8", 4),
+    ("on_ground", "00455CE0 140", 4),
+    ("speed_air_x_self", "00455CE0 E0", 4),
+    ("speed_y_self", "00455CE0 E4", 4),
+    ("speed_x_attack", "00455CE0 EC", 4),
+    ("speed_y_attack", "00455CE0 F0", 4),
+    ("speed_ground_x_self", "00455CE0 14C", 4),
+    #Character select screen and menus
+    ("character", "003F0E0A", 1),
+    ("character", "003F0E2E", 2),
+    ("character", "003F0E52", 3),
+    ("character", "003F0E76", 4),
+    ("menu_state", "00479d30", 0),
+    ("stage", "004D6CAD", 0),
+    ("cursor_x", "01118DEC", 1),
+    ("cursor_y", "01118DF0", 1),
+    ("cursor_x", "0111826C", 2),
+    ("cursor_y", "01118270", 2),
+    ("cursor_x", "011176EC", 3),
+    ("cursor_y", "011176F0", 3),
+    ("cursor_x", "01116B6C", 4),
+    ("cursor_y", "01116B70", 4),
+    #Frame counter. This always has to be watched, since it drives GameState.step
+    ("frame", "00479D60", 0),
+    #projectiles
+    ("projectiles", "00BDA4A4 8 2C 60", 0),
+    #Character select screen cursor token status for each player
+    ("coin_down", "004a0bc0 2", 1),
+    ("coin_down", "004a0bc4 2", 2),
+    ("coin_down", "004a0bc8 2", 3),
+    ("coin_down", "004a0bcc 2", 4),
+    ("stage_select_cursor_x", "00bda810 28 38", 0),
+    ("stage_select_cursor_y", "00bda810 28 3c", 0),
+    ("ready_to_start", "004d6cf2", 0),
+    #Character controller type
+    ("controller_status", "003F0E08", 1),
+    ("controller_status", "003F0E2C", 2),
+    ("controller_status", "003F0E50", 3),
+    ("controller_status", "003F0E74", 4),
+    #Hitbox data
+    ("hitbox_1_size", "00453130 990", 1),
+    ("hitbox_2_size", "00453130 AC8", 1),
+    ("hitbox_3_size", "00453130 C00", 1),
+    ("hitbox_4_size", "00453130 D38", 1),
+    ("hitbox_1_status", "00453130 974", 1),
+    ("hitbox_2_status", "00453130 AAC", 1),
+    ("hitbox_3_status", "00453130 BE4", 1),
+    ("hitbox_4_status", "00453130 D1C", 1),
+    ("hitbox_1_x", "00453130 9C0", 1),
+    ("hitbox_1_y", "00453130 9C4", 1),
+    ("hitbox_2_x", "00453130 AF8", 1),
+    ("hitbox_2_y", "00453130 AFC", 1),
+    ("hitbox_3_x", "00453130 C30", 1),
+    ("hitbox_3_y", "00453130 C34", 1),
+    ("hitbox_4_x", "00453130 D68", 1),
+    ("hitbox_4_y", "00453130 D6C", 1),
+    ("iasa", "00453130 2278", 1),
+    ("iasa", "00453FC0 2278", 2),
+    ("iasa", "00454E50 2278", 3),
+    ("iasa", "00455CE0 2278", 4),
+    #Transformed
+    ("transformed", "0045308C", 1),
+    ("transformed", "00453F1C", 2),
+    ("transformed", "00454DAC", 3),
+    ("transformed", "00455C3C", 4),
+    # Sub players
+    ("action", "00453134 70", 5),
+    ("action_counter", "00453134 20CC", 5),
+    ("action_frame", "00453134 8F4", 5),
+    ("invulnerable", "00453134 19EC", 5),
+    ("hitlag_frames_left", "00453134 19BC", 5),
+    ("hitstun_frames_left", "00453134 23a0", 5),
+    ("charging_smash", "00453134 2174", 5),
+    ("jumps_left", "00453134 19C8", 5),
+    ("on_ground", "00453134 140", 5),
+    ("speed_air_x_self", "00453134 E0", 5),
+    ("speed_y_self", "00453134 E4", 5),
+    ("speed_x_attack", "00453134 EC", 5),
+    ("speed_y_attack", "00453134 F0", 5),
+    ("speed_ground_x_self", "00453134 14C", 5),
+    ("percent", "00453134 1890", 5),
+    ("facing", "00453134 8C", 5),
+    ("x", "00453134 110", 5),
+    ("y", "00453134 114", 5),
+    ("action", "00453FC4 70", 6),
+    ("action_counter", "00453FC4 20CC", 6),
+    ("action_frame", "00453FC4 8F4", 6),
+    ("invulnerable", "00453FC4 19EC", 6),
+    ("hitlag_frames_left", "00453FC4 19BC", 6),
+    ("hitstun_frames_left", "00453FC4 23a0", 6),
+    ("charging_smash", "00453FC4 2174", 6),
+    ("jumps_left", "00453FC4 19C8", 6),
+    ("on_ground", "00453FC4 140", 6),
+    ("speed_air_x_self", "00453FC4 E0", 6),
+    ("speed_y_self", "00453FC4 E4", 6),
+    ("speed_x_attack", "00453FC4 EC", 6),
+    ("speed_y_attack", "00453FC4 F0", 6),
+    ("speed_ground_x_self", "00453FC4 14C", 6),
+    ("percent", "00453FC4 1890", 6),
+    ("facing", "00453FC4 8C", 6),
+    ("x", "00453FC4 110", 6),
+    ("y", "00453FC4 114", 6),
+    ("action", "00454E54 70", 7),
+    ("action_counter", "00454E54 20CC", 7),
+    ("action_frame", "00454E54 8F4", 7),
+    ("invulnerable", "00454E54 19EC", 7),
+    ("hitlag_frames_left", "00454E54 19BC", 7),
+    ("hitstun_frames_left", "00454E54 23a0", 7),
+    ("charging_smash", "00454E54 2174", 7),
+    ("jumps_left", "00454E54 19C8", 7),
+    ("on_ground", "00454E54 140", 7),
+    ("speed_air_x_self", "00454E54 E0", 7),
+    ("speed_y_self", "00454E54 E4", 7),
+    ("speed_x_attack", "00454E54 EC", 7),
+    ("speed_y_attack", "00454E54 F0", 7),
+    ("speed_ground_x_self", "00454E54 14C", 7),
+    ("percent", "00454E54 1890", 7),
+    ("facing", "00454E54 8C", 7),
+    ("x", "00454E54 110", 7),
+    ("y", "00454E54 114", 7),
+    ("action", "00455CE4 70", 8),
+    ("action_counter", "00455CE4 20CC", 8),
+    ("action_frame", "00455CE4 8F4", 8),
+    ("invulnerable", "00455CE4 19EC", 8),
+    ("hitlag_frames_left", "00455CE4 19BC", 8),
+    ("hitstun_frames_left", "00455CE4 23a0", 8),
+    ("charging_smash", "00455CE4 2174", 8),
+    ("jumps_left", "00455CE4 19C8", 8),
+    ("on_ground", "00455CE4 140", 8),
+    ("speed_air_x_self", "00455CE4 E0", 8),
+    ("speed_y_self", "00455CE4 E4", 8),
+    ("speed_x_attack", "00455CE4 EC", 8),
+    ("speed_y_attack", "00455CE4 F0", 8),
+    ("speed_ground_x_self", "00455CE4 14C", 8),
+    ("percent", "00455CE4 1890", 8),
+    ("facing", "00455CE4 8C", 8),
+    ("x", "00455CE4 110", 8),
+    ("y", "00455CE4 114", 8),
+    #Whether each player is playing as Zelda
+    ("iszelda", "00453084", 1),
+    ("iszelda", "00453F14", 2),
+    ("iszelda", "00454DA4", 3),
+    ("iszelda", "00455C34", 4),
+]
+
+#Labels that are always watched, no matter what was asked for
+REQUIRED = ["frame"]
+
+"""Pick out the locations for the given list of labels
+    names = List of labels to watch, or None for all of them
+    Returns a list of (label, address, player) tuples"""
+def select(names=None):
+    if names is None:
+        return list(LOCATIONS)
+    for name in names:
+        if name not in SPECS:
+            raise ValueError("Unknown field: " + str(name))
+    names = set(names) | set(REQUIRED)
+    return [location for location in LOCATIONS if location[0] in names]
+
+"""Write out a locations.csv for the given list of labels"""
+def writecsv(path, names=None):
+    with open(path, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile, quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n")
+        writer.writerow(["Name", "Address", "Player"])
+        for name, address, player in select(names):
+            writer.writerow([name, address, player])
+
+if __name__ == "__main__":
+    from melee import decoder
+    path = os.path.dirname(os.path.realpath(__file__))
+    decoder.writelocations(path + "/Locations.txt", decoder.compilelocations())
+    writecsv(path + "/locations.csv")
@@ -1,5 +1,6 @@
 """Helper functions for with some techskill examples"""
 from melee import enums
+from melee.macro import Macro, inputs
 
 """Frame-perfect Multishines as Fox"""
 def multishine(ai_state, controller):
@@ -40,3 +41,18 @@ def upsmashes(ai_state, controller):
         return
 
     controller.empty_input()
+
+"""The same as multishine(), as a Macro for Controller.play()
+    Shine start doesn't check on_ground here, since multishining never leaves it"""
+MULTISHINE = Macro([
+    (0, enums.Action.STANDING, inputs([enums.Button.BUTTON_B], main=(.5, 0))),
+    (0, (enums.Action.KNEE_BEND, 3), inputs([enums.Button.BUTTON_B], main=(.5, 0))),
+    (0, (enums.Action.DOWN_B_STUN, range(4, 60)), inputs([enums.Button.BUTTON_Y])),
+    (0, (enums.Action.DOWN_B_GROUND_START, range(4, 60)), inputs([enums.Button.BUTTON_Y])),
+    (0, enums.Action.DOWN_B_GROUND, inputs([enums.Button.BUTTON_Y])),
+])
+
+"""The same as upsmashes(), as a Macro for Controller.play()"""
+UPSMASHES = Macro([
+    (0, enums.Action.STANDING, inputs(c=(.5, 1))),
+])